@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -25,7 +26,7 @@ SECRET_KEY = "django-insecure-n^udvu%4nd$$m8$w1r(n0_=iwy=!sdpf030mk$zye(@)bx)$gz
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
-ALLOWED_HOSTS = ["habit-tracker-y3no.onrender.com"]
+ALLOWED_HOSTS = ["habit-tracker-y3no.onrender.com", "localhost", "127.0.0.1"]
 
 
 # Application definition
@@ -43,12 +44,14 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "tracker.routers.ReplicaStickinessMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "tracker.middleware.DatabaseBusyMiddleware",
 ]
 
 ROOT_URLCONF = "config.urls"
@@ -84,6 +87,30 @@ DATABASES = {
     }
 }
 
+# Optional read replica for analytics/report reads (see tracker/routers.py).
+# Locally, point REPLICA_DB_PATH at a copy of db.sqlite3; it is opened read-only.
+# Without it every query goes to "default".
+if os.environ.get("REPLICA_DB_PATH"):
+    DATABASES["replica"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": f"file:{os.environ['REPLICA_DB_PATH']}?mode=ro",
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["tracker.routers.PrimaryReplicaRouter"]
+
+# Seconds a client's reads stay on the primary after it writes (read-your-writes).
+# Also the assumed upper bound of replica lag for cached analytics.
+REPLICA_STICKY_SECONDS = 10
+
+# Serve the previous analytics result while a refresh runs in the background.
+# Faster under load, but a user may briefly see charts without their latest log.
+# No CACHES setting means LocMemCache: cached results, data versions and request
+# coalescing are per process, so cached pages are capped at a few minutes
+# (tracker/singleflight.py cache_timeout). Configure a shared backend (redis, memcached,
+# database) to share them across gunicorn workers and keep the full timeouts.
+ANALYTICS_STALE_WHILE_REVALIDATE = False
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -1,23 +1,83 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections, DatabaseError
+from django.utils.functional import cached_property
 from .models import Habit, DailyEntry, HabitLog
 
+
+class EstimatedCountPaginator(Paginator):
+    # Unfiltered changelists use the planner's row estimate instead of COUNT(*),
+    # which is a full scan on large tables. Filtered querysets are counted exactly.
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        if not qs.query.where:
+            estimate = self._estimate(qs)
+            if estimate is not None:
+                return estimate
+        return super().count
+
+    def _estimate(self, qs):
+        connection = connections[qs.db]
+        table = qs.model._meta.db_table
+        try:
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+                elif connection.vendor == 'sqlite':
+                    # Populated by ANALYZE; first number of any row is the table row count
+                    cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+                else:
+                    return None
+                row = cursor.fetchone()
+        except DatabaseError:
+            return None
+        if not row or row[0] is None:
+            return None
+        estimate = int(str(row[0]).split()[0])
+        # reltuples is -1 for never-analyzed tables
+        return estimate if estimate > 0 else None
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
 @admin.register(Habit)
-class HabitAdmin(admin.ModelAdmin):
+class HabitAdmin(ScalableAdmin):
     list_display = ('name', 'user', 'category', 'target_value', 'unit')
+    list_select_related = ('user',)
     search_fields = ('name', 'user__username')
     list_filter = ('category',)
+    autocomplete_fields = ('user',)
 
 class HabitLogInline(admin.TabularInline):
     model = HabitLog
     extra = 1
+    autocomplete_fields = ('habit',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('habit')
 
 @admin.register(DailyEntry)
-class DailyEntryAdmin(admin.ModelAdmin):
+class DailyEntryAdmin(ScalableAdmin):
     list_display = ('date', 'user', 'productivity_score', 'mood_score')
-    list_filter = ('user', 'date')
+    list_select_related = ('user',)
+    # Filtering by user goes through search; a user sidebar lists every account
+    search_fields = ('user__username',)
+    # date_hierarchy runs MIN/MAX and SELECT DISTINCT over dates to build its links;
+    # the index on DailyEntry.date keeps those to index scans
+    date_hierarchy = 'date'
+    autocomplete_fields = ('user',)
     inlines = [HabitLogInline]
 
 @admin.register(HabitLog)
-class HabitLogAdmin(admin.ModelAdmin):
+class HabitLogAdmin(ScalableAdmin):
     list_display = ('habit', 'entry', 'value')
-
+    list_select_related = ('habit__user', 'entry__user')
+    search_fields = ('habit__name', 'user__username')
+    # No date_hierarchy here: on entry__date its MIN/MAX/DISTINCT queries join every log
+    # to its entry. DateFieldListFilter's choices (today, past 7 days, ...) need no query.
+    list_filter = ('entry__date',)
+    autocomplete_fields = ('habit', 'entry')
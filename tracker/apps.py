@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class TrackerConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "tracker"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .search import ensure_index_after_migrate
+        post_migrate.connect(ensure_index_after_migrate, sender=self)
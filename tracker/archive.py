@@ -0,0 +1,205 @@
+import struct
+import zlib
+from datetime import date
+import numpy as np
+import pandas as pd
+from django.db import router, transaction
+from .models import Habit, DailyEntry, HabitLog, HabitArchive
+from .signals import data_version_key
+from .singleflight import bump_version
+
+# Columnar archive for cold HabitLog rows.
+# Each user's archived logs are stored as parallel arrays (log id, date ordinal, habit id,
+# float32 value), sorted by (habit, date) and zlib-compressed into HabitArchive.data.
+# Log ids are kept so un-archived rows come back under the same primary key.
+# Reading decompresses once and slices the buffer with np.frombuffer, so no per-row
+# Python objects are created. Hot rows in HabitLog always win over archived ones, and
+# archived rows whose DailyEntry was deleted are ignored, like the live logs it cascaded to.
+
+MAGIC = b'HLA1'
+HEADER = struct.Struct('<4sI')
+EMPTY = (np.empty(0, np.int64), np.empty(0, np.int32), np.empty(0, np.int64), np.empty(0, np.float32))
+DELETE_BATCH = 500
+
+
+def pack(ids, dates, habit_ids, values):
+    order = np.lexsort((dates, habit_ids))
+    ids = np.ascontiguousarray(ids[order], dtype=np.int64)
+    dates = np.ascontiguousarray(dates[order], dtype=np.int32)
+    habit_ids = np.ascontiguousarray(habit_ids[order], dtype=np.int64)
+    values = np.ascontiguousarray(values[order], dtype=np.float32)
+    raw = HEADER.pack(MAGIC, len(dates)) + ids.tobytes() + dates.tobytes() + habit_ids.tobytes() + values.tobytes()
+    return zlib.compress(raw, 6)
+
+
+def unpack(blob):
+    raw = zlib.decompress(blob)
+    magic, n = HEADER.unpack_from(raw)
+    if magic != MAGIC:
+        raise ValueError("Not a habit log archive")
+    offset = HEADER.size
+    ids = np.frombuffer(raw, np.int64, n, offset)
+    offset += ids.nbytes
+    dates = np.frombuffer(raw, np.int32, n, offset)
+    offset += dates.nbytes
+    habit_ids = np.frombuffer(raw, np.int64, n, offset)
+    offset += habit_ids.nbytes
+    values = np.frombuffer(raw, np.float32, n, offset)
+    return ids, dates, habit_ids, values
+
+
+def as_float64(values):
+    # Shortest decimal that round-trips the float32, so 8.8 comes back as 8.8, not 8.800000190734863
+    return values.astype(str).astype(np.float64)
+
+
+def load_archive(user_id, using=None):
+    """Archived (ids, dates, habit ids, values) of a user, limited to days that still have an entry."""
+    archive = HabitArchive.objects.using(using).filter(user_id=user_id).values_list('data', 'cutoff').first()
+    if archive is None:
+        return EMPTY
+    ids, dates, habit_ids, values = unpack(bytes(archive[0]))
+    # Deleting an entry deletes its live logs; its archived logs are dropped here the same way
+    days = (
+        DailyEntry.objects.using(using).filter(user_id=user_id, date__lt=archive[1])
+        .order_by().values_list('date', flat=True)
+    )
+    keep = np.isin(dates, np.fromiter((day.toordinal() for day in days), np.int32))
+    return ids[keep], dates[keep], habit_ids[keep], values[keep]
+
+
+def attach_archive(habits):
+    """Load each owner's archive once for a list of habits (e.g. a list view)."""
+    archives = {}
+    for habit in habits:
+        if habit.user_id not in archives:
+            archives[habit.user_id] = load_archive(habit.user_id)
+        habit._archive = archives[habit.user_id]
+    return habits
+
+
+def _habit_archive(habit):
+    # Decompressed at most once per Habit instance
+    if not hasattr(habit, '_archive'):
+        habit._archive = load_archive(habit.user_id)
+    return habit._archive
+
+
+def archived_series(habit, start=None, end=None):
+    """(date ordinals, values) archived for one habit, optionally limited to [start, end]."""
+    _, dates, habit_ids, values = _habit_archive(habit)
+    lo, hi = np.searchsorted(habit_ids, [habit.pk, habit.pk + 1])
+    dates, values = dates[lo:hi], values[lo:hi]
+    if start is not None or end is not None:
+        a = np.searchsorted(dates, start.toordinal()) if start else 0
+        b = np.searchsorted(dates, end.toordinal(), side='right') if end else len(dates)
+        dates, values = dates[a:b], values[a:b]
+    return dates, values
+
+
+def load_habit_frame(habit):
+    """DataFrame of date/value/productivity/mood for a habit, archive and live rows merged."""
+    hot = pd.DataFrame.from_records(
+        HabitLog.objects.filter(habit=habit).values_list(
+            'entry__date', 'value', 'entry__productivity_score', 'entry__mood_score'
+        ),
+        columns=['date', 'value', 'productivity', 'mood'],
+    )
+    dates, values = archived_series(habit)
+    if not len(dates):
+        return hot.sort_values('date', ignore_index=True)
+
+    hot_dates = np.fromiter((d.toordinal() for d in hot['date']), np.int32, len(hot))
+    keep = ~np.isin(dates, hot_dates)
+    dates, values = dates[keep], values[keep]
+    cold = pd.DataFrame({
+        'date': [date.fromordinal(d) for d in dates.tolist()],
+        'value': as_float64(values),
+    })
+    scores = pd.DataFrame.from_records(
+        DailyEntry.objects.filter(user_id=habit.user_id, date__lte=cold['date'].max(), date__gte=cold['date'].min())
+        .values_list('date', 'productivity_score', 'mood_score'),
+        columns=['date', 'productivity', 'mood'],
+    )
+    cold = cold.merge(scores, on='date', how='inner')
+    return pd.concat([cold, hot], ignore_index=True).sort_values('date', ignore_index=True)
+
+
+def _day_keys(habit_ids, dates):
+    # One int64 per (habit, day); date ordinals stay below 2**22
+    return habit_ids.astype(np.int64) << 22 | dates.astype(np.int64)
+
+
+def archive_user(user, cutoff):
+    """Move the user's logs dated before `cutoff` into their archive. Returns rows moved."""
+    with transaction.atomic():
+        # Lock the rows so a concurrent edit can't change a value between reading and deleting it
+        rows = list(
+            HabitLog.objects.filter(user=user, entry__date__lt=cutoff)
+            .select_for_update(of=('self',))
+            .values_list('id', 'entry__date', 'habit_id', 'value')
+        )
+        if not rows:
+            return 0
+
+        ids = np.fromiter((row[0] for row in rows), np.int64, len(rows))
+        dates = np.fromiter((row[1].toordinal() for row in rows), np.int32, len(rows))
+        habit_ids = np.fromiter((row[2] for row in rows), np.int64, len(rows))
+        values = np.fromiter((row[3] for row in rows), np.float32, len(rows))
+
+        archive = HabitArchive.objects.select_for_update().filter(user=user).first()
+        if archive:
+            old_ids, old_dates, old_habits, old_values = unpack(bytes(archive.data))
+            # A day logged again after it was archived is archived again; the newer row wins
+            keep = ~np.isin(_day_keys(old_habits, old_dates), _day_keys(habit_ids, dates))
+            old_ids, old_dates, old_habits, old_values = old_ids[keep], old_dates[keep], old_habits[keep], old_values[keep]
+            ids = np.concatenate([old_ids, ids])
+            dates = np.concatenate([old_dates, dates])
+            habit_ids = np.concatenate([old_habits, habit_ids])
+            values = np.concatenate([old_values, values])
+        else:
+            archive = HabitArchive(user=user)
+
+        archive.data = pack(ids, dates, habit_ids, values)
+        archive.row_count = len(dates)
+        archive.cutoff = max(cutoff, archive.cutoff) if archive.cutoff else cutoff
+        archive.save()
+
+        # Delete exactly the rows that were packed. A raw delete skips the post_delete signal:
+        # Django would otherwise load every row to send it, and archived rows still exist
+        # logically, so sync clients must not get tombstones for them.
+        packed = [row[0] for row in rows]
+        using = router.db_for_write(HabitLog)
+        for start in range(0, len(packed), DELETE_BATCH):
+            HabitLog.objects.filter(id__in=packed[start:start + DELETE_BATCH])._raw_delete(using)
+    bump_version(data_version_key(user.pk))
+    return len(rows)
+
+
+def unarchive_user(user):
+    """Restore every archived log of the user into HabitLog and drop the archive."""
+    with transaction.atomic():
+        archive = HabitArchive.objects.select_for_update().filter(user=user).first()
+        if archive is None:
+            return 0
+        ids, dates, habit_ids, values = unpack(bytes(archive.data))
+        habits = set(Habit.objects.filter(user=user).values_list('id', flat=True))
+        entries = dict(
+            DailyEntry.objects.filter(user=user, date__lt=archive.cutoff).values_list('date', 'id')
+        )
+        existing = set(
+            HabitLog.objects.filter(user=user, entry__date__lt=archive.cutoff)
+            .values_list('entry_id', 'habit_id')
+        )
+        restored = []
+        columns = zip(ids.tolist(), dates.tolist(), habit_ids.tolist(), as_float64(values).tolist())
+        for log_id, ordinal, habit_id, value in columns:
+            entry_id = entries.get(date.fromordinal(ordinal))
+            if entry_id is None or habit_id not in habits or (entry_id, habit_id) in existing:
+                continue
+            restored.append(HabitLog(id=log_id, entry_id=entry_id, habit_id=habit_id, user=user, value=value))
+            existing.add((entry_id, habit_id))
+        HabitLog.objects.bulk_create(restored, batch_size=1000)
+        archive.delete()
+    bump_version(data_version_key(user.pk))
+    return len(restored)
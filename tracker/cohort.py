@@ -0,0 +1,222 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+import pandas as pd
+import django
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from .archive import as_float64, load_archive
+from .models import Habit, DailyEntry, HabitLog, HabitArchive, CohortReport
+
+# Cross-user cohort analytics.
+# Users are processed in chunks; each chunk is reduced to per-user sufficient statistics
+# (n, sums, centered cross-products) and then folded into fixed-size per-group accumulators,
+# so memory depends on the number of habit names/categories, never on the number of users.
+# Archived logs (tracker/archive.py) are merged in; a live log wins over an archived one.
+
+METRICS = ('productivity', 'mood')
+MIN_SAMPLES = 3
+BINS = np.round(np.linspace(-1.0, 1.0, 21), 2)
+CHUNK_SIZE = 200
+
+
+class GroupStats:
+    """Mergeable statistics for one (group, metric) pair."""
+
+    def __init__(self):
+        self.users = 0
+        self.samples = 0
+        self.hist = np.zeros(len(BINS) - 1, dtype=np.int64)
+        self.sum_r = 0.0
+        self.sum_r2 = 0.0
+        # Pooled within-user centered sums of squares / cross-products
+        self.cxx = 0.0
+        self.cyy = 0.0
+        self.cxy = 0.0
+
+    def add_users(self, n, r, cxx, cyy, cxy):
+        self.users += len(r)
+        self.samples += int(n.sum())
+        self.hist += np.histogram(np.clip(r, -1.0, 1.0), bins=BINS)[0]
+        self.sum_r += float(r.sum())
+        self.sum_r2 += float((r ** 2).sum())
+        self.cxx += float(cxx.sum())
+        self.cyy += float(cyy.sum())
+        self.cxy += float(cxy.sum())
+
+    def merge(self, other):
+        self.users += other.users
+        self.samples += other.samples
+        self.hist += other.hist
+        self.sum_r += other.sum_r
+        self.sum_r2 += other.sum_r2
+        self.cxx += other.cxx
+        self.cyy += other.cyy
+        self.cxy += other.cxy
+
+    def _quantile(self, q):
+        cdf = np.cumsum(self.hist)
+        idx = int(np.searchsorted(cdf, q * cdf[-1]))
+        return float((BINS[idx] + BINS[idx + 1]) / 2)
+
+    def summary(self):
+        mean = self.sum_r / self.users
+        var = max(self.sum_r2 / self.users - mean ** 2, 0.0)
+        denom = np.sqrt(self.cxx * self.cyy)
+        return {
+            'users': self.users,
+            'samples': self.samples,
+            'mean_r': mean,
+            'std_r': float(np.sqrt(var)),
+            'p25': self._quantile(0.25),
+            'median': self._quantile(0.5),
+            'p75': self._quantile(0.75),
+            'pooled_r': float(self.cxy / denom) if denom > 0 else None,
+            'histogram': self.hist.tolist(),
+        }
+
+
+def _user_chunks(chunk_size, using):
+    # Keyset pagination keeps each query cheap regardless of table size
+    last_id = 0
+    while True:
+        ids = list(User.objects.using(using).filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+COLUMNS = ['user', 'name', 'category', 'x', 'productivity', 'mood']
+
+
+def _archived_frame(user_ids, using, live):
+    # Archived logs of the chunk's users in the same columns as the live frame
+    archived_users = list(
+        HabitArchive.objects.using(using).filter(user_id__in=user_ids).values_list('user_id', flat=True)
+    )
+    frames = []
+    for user_id in archived_users:
+        _, dates, habit_ids, values = load_archive(user_id, using)
+        frames.append(pd.DataFrame({'user': user_id, 'habit': habit_ids, 'day': dates, 'x': as_float64(values)}))
+    if not frames:
+        return None
+    cold = pd.concat(frames, ignore_index=True)
+
+    hot_keys = pd.MultiIndex.from_arrays([live['habit'], live['day']])
+    cold = cold[~pd.MultiIndex.from_arrays([cold['habit'], cold['day']]).isin(hot_keys)]
+    habits = pd.DataFrame.from_records(
+        Habit.objects.using(using).filter(user_id__in=archived_users).values_list('id', 'name', 'category'),
+        columns=['habit', 'name', 'category'],
+    )
+    scores = pd.DataFrame.from_records(
+        (
+            (user, day.toordinal(), productivity, mood) for user, day, productivity, mood in
+            DailyEntry.objects.using(using).filter(user_id__in=archived_users)
+            .values_list('user_id', 'date', 'productivity_score', 'mood_score').iterator(chunk_size=5000)
+        ),
+        columns=['user', 'day', 'productivity', 'mood'],
+    )
+    cold = cold.merge(habits, on='habit').merge(scores, on=['user', 'day'])
+    return cold[COLUMNS]
+
+
+def chunk_stats(user_ids, using=None):
+    """Reduce one chunk of users to {(kind, group, metric): GroupStats}."""
+    rows = HabitLog.objects.using(using).filter(user_id__in=user_ids).values_list(
+        'user_id', 'habit__name', 'habit__category',
+        'value', 'entry__productivity_score', 'entry__mood_score', 'habit_id', 'entry__date',
+    )
+    df = pd.DataFrame.from_records(
+        rows.iterator(chunk_size=5000),
+        columns=[*COLUMNS, 'habit', 'date'],
+    )
+    df['day'] = np.fromiter((day.toordinal() for day in df['date']), np.int64, len(df))
+    cold = _archived_frame(user_ids, using, df)
+    df = df[COLUMNS]
+    if cold is not None:
+        df = pd.concat([df, cold], ignore_index=True)
+    result = {}
+    if df.empty:
+        return result
+
+    # Group habits case-insensitively: "Sleep" and "sleep " are the same habit across users
+    df['name'] = df['name'].str.strip().str.lower()
+    df['category'] = df['category'].str.strip().str.lower()
+    df['xx'] = df['x'] ** 2
+
+    for metric in METRICS:
+        df['y'] = df[metric].astype(float)
+        df['yy'] = df['y'] ** 2
+        df['xy'] = df['x'] * df['y']
+        for kind in ('name', 'category'):
+            sums = df.groupby([kind, 'user'])[['x', 'y', 'xx', 'yy', 'xy']].sum()
+            sums['n'] = df.groupby([kind, 'user']).size()
+            sums = sums[sums['n'] >= MIN_SAMPLES]
+            n = sums['n'].to_numpy(dtype=float)
+            cxx = sums['xx'].to_numpy() - sums['x'].to_numpy() ** 2 / n
+            cyy = sums['yy'].to_numpy() - sums['y'].to_numpy() ** 2 / n
+            cxy = sums['xy'].to_numpy() - sums['x'].to_numpy() * sums['y'].to_numpy() / n
+            valid = (cxx > 1e-12) & (cyy > 1e-12)
+            r = np.zeros_like(cxy)
+            r[valid] = cxy[valid] / np.sqrt(cxx[valid] * cyy[valid])
+
+            groups = sums.index.get_level_values(0).to_numpy()
+            for group in np.unique(groups[valid]):
+                mask = valid & (groups == group)
+                stats = result.setdefault((kind, group, metric), GroupStats())
+                stats.add_users(n[mask], r[mask], cxx[mask], cyy[mask], cxy[mask])
+    return result
+
+
+def _init_worker():
+    # Spawned workers need their own app registry; forked ones already have it
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    django.setup()
+
+
+def _merge(totals, partial):
+    for key, stats in partial.items():
+        if key in totals:
+            totals[key].merge(stats)
+        else:
+            totals[key] = stats
+
+
+def build_report(workers=1, chunk_size=CHUNK_SIZE, using=None):
+    # `using` pins every query to one alias (e.g. the replica); None lets the router decide
+    totals = {}
+    if workers <= 1:
+        for ids in _user_chunks(chunk_size, using):
+            _merge(totals, chunk_stats(ids, using))
+    else:
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker) as pool:
+            # Bound the number of in-flight chunks so results never pile up in memory
+            pending = set()
+            for ids in _user_chunks(chunk_size, using):
+                if not pending:
+                    # Workers are forked on submit; they must not inherit an open DB connection
+                    connections.close_all()
+                pending.add(pool.submit(chunk_stats, ids, using))
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        _merge(totals, future.result())
+            for future in pending:
+                _merge(totals, future.result())
+
+    report = {'by_name': {}, 'by_category': {}, 'bins': BINS.tolist()}
+    for (kind, group, metric), stats in sorted(totals.items()):
+        report[f'by_{kind}'].setdefault(group, {})[metric] = stats.summary()
+    return report
+
+
+def save_report(report, duration):
+    """Store `report` as the latest cohort report, replacing earlier runs."""
+    with transaction.atomic():
+        saved = CohortReport.objects.create(data=report, duration=duration)
+        CohortReport.objects.exclude(pk=saved.pk).delete()
+    return saved
@@ -37,3 +37,15 @@ class HabitLogForm(forms.ModelForm):
             'habit': forms.Select(attrs={'class': 'w-full p-2 border rounded mb-4'}),
             'value': forms.NumberInput(attrs={'class': 'w-full p-2 border rounded mb-4'}),
         }
+
+class JournalSearchForm(forms.Form):
+    q = forms.CharField(max_length=200, required=False, label="Search notes",
+                        widget=forms.TextInput(attrs={'class': 'w-full p-2 border rounded', 'placeholder': 'e.g. slept badly'}))
+    date_from = forms.DateField(required=False, label="From",
+                                widget=forms.DateInput(attrs={'type': 'date', 'class': 'w-full p-2 border rounded'}))
+    date_to = forms.DateField(required=False, label="To",
+                              widget=forms.DateInput(attrs={'type': 'date', 'class': 'w-full p-2 border rounded'}))
+    min_productivity = forms.IntegerField(required=False, min_value=1, max_value=10, label="Min productivity",
+                                          widget=forms.NumberInput(attrs={'class': 'w-full p-2 border rounded'}))
+    min_mood = forms.IntegerField(required=False, min_value=1, max_value=10, label="Min mood",
+                                  widget=forms.NumberInput(attrs={'class': 'w-full p-2 border rounded'}))
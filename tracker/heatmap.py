@@ -0,0 +1,86 @@
+from datetime import date, timedelta
+from django.utils import timezone
+from django.utils.html import escape
+from .models import HabitLog
+from .archive import archived_series, as_float64
+
+# GitHub-style calendar heatmap rendered as plain SVG markup.
+# Much cheaper than a matplotlib figure: one log query, a few KB of text, no base64.
+# Cells are drawn as one <path> per colour level: each cell is a short horizontal stroke
+# CELL units wide, so a year of data is a handful of elements instead of 365.
+
+CELL = 11
+GAP = 2
+STEP = CELL + GAP
+LEFT = 28
+TOP = 16
+
+# Colour buckets by value / target_value ratio
+EMPTY_COLOR = '#ebedf0'
+LEVEL_COLORS = ['#c6e48b', '#7bc96f', '#239a3b', '#196127']
+LEVEL_BOUNDS = [0.25, 0.5, 1.0]  # ratio < bound -> level index
+
+MONTH_LABELS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+DAY_LABELS = {1: 'Mon', 3: 'Wed', 5: 'Fri'}
+
+
+def _level(value, target):
+    if target <= 0:
+        return len(LEVEL_COLORS) - 1 if value > 0 else 0
+    ratio = value / target
+    for i, bound in enumerate(LEVEL_BOUNDS):
+        if ratio < bound:
+            return i
+    return len(LEVEL_COLORS) - 1
+
+
+def render_heatmap_svg(habit, end=None, days=365):
+    end = end or timezone.localdate()
+    start = end - timedelta(days=days - 1)
+    # Align the first column to Sunday like GitHub does
+    grid_start = start - timedelta(days=(start.weekday() + 1) % 7)
+
+    archived_dates, archived_values = archived_series(habit, start, end)
+    values = dict(zip(map(date.fromordinal, archived_dates.tolist()), as_float64(archived_values).tolist()))
+    values.update(
+        HabitLog.objects
+        .filter(habit=habit, entry__date__range=(start, end))
+        .values_list('entry__date', 'value')
+    )
+
+    weeks = (end - grid_start).days // 7 + 1
+    width = LEFT + weeks * STEP
+    height = TOP + 7 * STEP
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" '
+        f'width="100%" class="habit-heatmap" font-family="sans-serif" font-size="9" fill="#767676">',
+        f'<title>{escape(habit.name)}: {len(values)} days logged, '
+        f'target {habit.target_value:g} {escape(habit.unit)}</title>',
+    ]
+    for row, label in DAY_LABELS.items():
+        parts.append(f'<text x="0" y="{TOP + row * STEP + CELL - 2}">{label}</text>')
+
+    # Cell strokes per colour; index 0 is "no log"
+    strokes = [[] for _ in range(len(LEVEL_COLORS) + 1)]
+    last_month = None
+    day = grid_start
+    while day <= end:
+        offset = (day - grid_start).days
+        col, row = divmod(offset, 7)
+        x = LEFT + col * STEP
+        if row == 0 and day.month != last_month:
+            parts.append(f'<text x="{x}" y="{TOP - 6}">{MONTH_LABELS[day.month - 1]}</text>')
+            last_month = day.month
+        if day >= start:
+            value = values.get(day)
+            level = 0 if value is None else _level(value, habit.target_value) + 1
+            strokes[level].append(f'M{x} {TOP + row * STEP + CELL / 2:g}h{CELL}')
+        day += timedelta(days=1)
+
+    for color, cells in zip([EMPTY_COLOR, *LEVEL_COLORS], strokes):
+        if cells:
+            parts.append(f'<path fill="none" stroke="{color}" stroke-width="{CELL}" d="{"".join(cells)}"/>')
+
+    parts.append('</svg>')
+    return ''.join(parts)
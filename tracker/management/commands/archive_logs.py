@@ -0,0 +1,39 @@
+from datetime import date, timedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from tracker.archive import archive_user, unarchive_user
+
+
+class Command(BaseCommand):
+    help = "Pack old HabitLog rows into per-user columnar archives, or restore them with --restore."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', type=date.fromisoformat,
+                            help="Archive logs dated before this day (YYYY-MM-DD).")
+        parser.add_argument('--older-than-days', type=int, default=365,
+                            help="Archive logs older than N days when --before is not given.")
+        parser.add_argument('--user', action='append', dest='usernames',
+                            help="Only this user (repeatable). Default: all users.")
+        parser.add_argument('--restore', action='store_true',
+                            help="Move archived logs back into HabitLog (needed before editing them).")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+            if not users.exists():
+                raise CommandError("No matching users.")
+
+        if options['restore']:
+            total = sum(unarchive_user(user) for user in users.iterator())
+            self.stdout.write(self.style.SUCCESS(f"Restored {total} logs."))
+            return
+
+        cutoff = options['before'] or date.today() - timedelta(days=options['older_than_days'])
+        total = 0
+        for user in users.iterator():
+            moved = archive_user(user, cutoff)
+            if moved:
+                self.stdout.write(f"{user.username}: archived {moved} logs")
+            total += moved
+        self.stdout.write(self.style.SUCCESS(f"Archived {total} logs dated before {cutoff}."))
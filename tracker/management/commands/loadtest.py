@@ -0,0 +1,315 @@
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from urllib.parse import urlencode, urlsplit
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.middleware.csrf import CSRF_ALLOWED_CHARS, CSRF_SECRET_LENGTH
+from django.utils.crypto import get_random_string
+from django.utils import timezone
+from tracker.models import Habit, DailyEntry, HabitLog, Tombstone
+
+# Self-contained load generator: starts a local server (or targets --url), logs in
+# simulated users by creating sessions directly, and replays a weighted mix of reads
+# and writes from a pool of client threads. Same --seed and options => same request sequence.
+#
+# Simulated users (loadtest_<n>) and their history live in the configured database, so run
+# it against a scratch copy. Their sessions are always removed at the end; --cleanup also
+# removes the users and their data. Lock timeouts are counted as db_locked: the server
+# answers them with 503 (tracker.middleware.DatabaseBusyMiddleware).
+
+ENDPOINTS = {
+    'home': ('GET', '/'),
+    'habits': ('GET', '/habits/'),
+    'journal': ('GET', '/journal/'),
+    'analytics': ('GET', '/analytics/'),
+    'analytics_habit': ('GET', '/analytics/habit/{habit}/'),
+    'log_add': ('POST', '/log/add/'),
+}
+DEFAULT_MIX = 'journal=5,home=3,habits=2,analytics=1,analytics_habit=3,log_add=2'
+USER_PREFIX = 'loadtest_'
+SEED_HABITS = [('Sleep', 8.0, 'hours'), ('Drink Water', 2000.0, 'ml'), ('Reading', 30.0, 'pages')]
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise CommandError(f"Unknown endpoint '{name}'. Choose from: {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class SimUser:
+    def __init__(self, user, habit_ids):
+        self.username = user.username
+        self.habit_ids = habit_ids
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        self.session_key = session.session_key
+        self.csrf = get_random_string(CSRF_SECRET_LENGTH, allowed_chars=CSRF_ALLOWED_CHARS)
+        self.cookie = (
+            f"{settings.SESSION_COOKIE_NAME}={self.session_key}; "
+            f"{settings.CSRF_COOKIE_NAME}={self.csrf}"
+        )
+
+
+class Command(BaseCommand):
+    help = "Replay a mix of concurrent reads and writes against a local server and report latency percentiles."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help="Simulated logged-in users.")
+        parser.add_argument('--concurrency', type=int, default=8, help="Client threads issuing requests.")
+        parser.add_argument('--duration', type=float, default=30, help="Measured seconds.")
+        parser.add_argument('--warmup', type=float, default=5, help="Seconds of traffic excluded from results.")
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f"Endpoint weights (default: {DEFAULT_MIX}).")
+        parser.add_argument('--think-time', type=float, default=0, help="Pause between a thread's requests, seconds.")
+        parser.add_argument('--seed', type=int, default=1, help="Random seed for the request sequence.")
+        parser.add_argument('--days', type=int, default=60, help="History generated for new simulated users.")
+        parser.add_argument('--url', help="Target an already running server instead of starting one.")
+        parser.add_argument('--workers', type=int, default=2, help="Server worker processes.")
+        parser.add_argument('--threads', type=int, default=4, help="Threads per gunicorn worker.")
+        parser.add_argument('--timeout', type=float, default=30, help="Per-request client timeout.")
+        parser.add_argument('--output', help="Write results as JSON to this file.")
+        parser.add_argument('--compare', help="Previous JSON results to diff against.")
+        parser.add_argument('--cleanup', action='store_true',
+                            help="Delete the simulated users and all their data afterwards.")
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options['mix'])
+        sim_users = self.prepare_users(options['users'], options['days'])
+
+        server = None
+        url = options['url']
+        try:
+            if not url:
+                port = free_port()
+                server = self.start_server(port, options)
+                url = f'http://127.0.0.1:{port}'
+            self.stdout.write(
+                f"Running {options['concurrency']} threads x {options['duration']}s "
+                f"(+{options['warmup']}s warmup) against {url}"
+            )
+            samples, wall = self.run(url, sim_users, mix, options)
+        finally:
+            if server:
+                server.terminate()
+                server.wait(10)
+            self.cleanup(sim_users, options['cleanup'])
+
+        results = self.summarize(samples, wall)
+        results['config'] = {
+            key: options[key] for key in
+            ('users', 'concurrency', 'duration', 'warmup', 'mix', 'think_time', 'seed', 'workers', 'threads')
+        }
+        self.report(results, options['compare'])
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def prepare_users(self, count, days):
+        today = timezone.now().date()
+        sim_users = []
+        for i in range(count):
+            user, created = User.objects.get_or_create(username=f'{USER_PREFIX}{i}')
+            if created:
+                user.set_unusable_password()
+                user.save()
+                rng = random.Random(i)
+                habits = Habit.objects.bulk_create([
+                    Habit(user=user, name=name, category='Health', target_value=target, unit=unit)
+                    for name, target, unit in SEED_HABITS
+                ])
+                entries = DailyEntry.objects.bulk_create([
+                    DailyEntry(user=user, date=today - timedelta(days=d),
+                               productivity_score=rng.randint(1, 10), mood_score=rng.randint(1, 10))
+                    for d in range(1, days + 1)
+                ])
+                HabitLog.objects.bulk_create([
+                    HabitLog(entry=entry, habit=habit, user=user, value=round(habit.target_value * rng.uniform(0.3, 1.3), 1))
+                    for entry in entries for habit in habits
+                ])
+            habit_ids = list(Habit.objects.filter(user=user).values_list('id', flat=True))
+            sim_users.append(SimUser(user, habit_ids))
+        return sim_users
+
+    def cleanup(self, sim_users, remove_users):
+        SessionStore.get_model_class().objects.filter(
+            session_key__in=[user.session_key for user in sim_users]
+        ).delete()
+        if not remove_users:
+            return
+        users = User.objects.filter(username__startswith=USER_PREFIX)
+        user_ids = list(users.values_list('id', flat=True))
+        users.delete()
+        # Tombstones have no FK constraint, so they outlive the cascade
+        Tombstone.objects.filter(user_id__in=user_ids).delete()
+        self.stdout.write(f"Removed {len(user_ids)} simulated users and their data")
+
+    def start_server(self, port, options):
+        if not shutil.which('gunicorn'):
+            raise CommandError("gunicorn is not installed; install it or pass --url.")
+        # Views are synchronous, so gunicorn's threaded workers are the server to measure
+        cmd = [
+            'gunicorn', '-b', f'127.0.0.1:{port}', '-w', str(options['workers']),
+            '--threads', str(options['threads']), '--log-level', 'warning', 'config.wsgi:application',
+        ]
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'config.settings')}
+        proc = subprocess.Popen(cmd, cwd=settings.BASE_DIR, env=env, stdout=sys.stdout, stderr=sys.stderr)
+
+        deadline = time.monotonic() + 20
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise CommandError(f"Server exited with code {proc.returncode}")
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+                return proc
+            except OSError:
+                time.sleep(0.2)
+        proc.terminate()
+        raise CommandError("Server did not start within 20s")
+
+    def run(self, url, sim_users, mix, options):
+        target = urlsplit(url)
+        names = list(mix)
+        weights = list(mix.values())
+        start = time.monotonic()
+        measure_from = start + options['warmup']
+        stop_at = measure_from + options['duration']
+        samples = []  # (endpoint, seconds, outcome)
+        lock = threading.Lock()
+
+        def client(index):
+            rng = random.Random(options['seed'] * 1000 + index)
+            conn = http.client.HTTPConnection(target.hostname, target.port, timeout=options['timeout'])
+            local = []
+            while time.monotonic() < stop_at:
+                name = rng.choices(names, weights)[0]
+                user = rng.choice(sim_users)
+                method, path = ENDPOINTS[name]
+                path = path.format(habit=rng.choice(user.habit_ids))
+                headers = {'Cookie': user.cookie}
+                body = None
+                if method == 'POST':
+                    body = urlencode({
+                        'csrfmiddlewaretoken': user.csrf,
+                        'habit': rng.choice(user.habit_ids),
+                        'value': round(rng.uniform(0, 10), 1),
+                    })
+                    headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+                began = time.monotonic()
+                try:
+                    conn.request(method, path, body=body, headers=headers)
+                    response = conn.getresponse()
+                    response.read()
+                    if response.status < 400:
+                        outcome = 'ok'
+                    elif response.status == 503:
+                        outcome = 'db_locked'
+                    else:
+                        outcome = f'http_{response.status}'
+                except socket.timeout:
+                    outcome = 'timeout'
+                    conn.close()
+                except (OSError, http.client.HTTPException):
+                    outcome = 'conn_error'
+                    conn.close()
+                finished = time.monotonic()
+
+                if began >= measure_from:
+                    local.append((name, finished - began, outcome))
+                if options['think_time']:
+                    time.sleep(options['think_time'])
+            conn.close()
+            with lock:
+                samples.extend(local)
+
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(options['concurrency'])]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return samples, options['duration']
+
+    def summarize(self, samples, wall):
+        by_endpoint = defaultdict(list)
+        for name, seconds, outcome in samples:
+            by_endpoint[name].append((seconds, outcome))
+
+        endpoints = {}
+        for name, rows in sorted(by_endpoint.items()):
+            latencies = np.array([seconds for seconds, _ in rows]) * 1000
+            outcomes = defaultdict(int)
+            for _, outcome in rows:
+                outcomes[outcome] += 1
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            endpoints[name] = {
+                'requests': len(rows),
+                'rps': len(rows) / wall,
+                'p50_ms': float(p50),
+                'p95_ms': float(p95),
+                'p99_ms': float(p99),
+                'max_ms': float(latencies.max()),
+                'error_rate': 1 - outcomes.get('ok', 0) / len(rows),
+                'outcomes': dict(outcomes),
+            }
+        total = len(samples)
+        errors = sum(1 for _, _, outcome in samples if outcome != 'ok')
+        return {
+            'total_requests': total,
+            'rps': total / wall,
+            'error_rate': errors / total if total else 0.0,
+            'endpoints': endpoints,
+        }
+
+    def report(self, results, compare_path):
+        previous = {}
+        if compare_path:
+            with open(compare_path) as f:
+                previous = json.load(f).get('endpoints', {})
+
+        self.stdout.write(
+            f"{'Endpoint':<16} {'Reqs':>7} {'RPS':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'Errors':>8}"
+        )
+        for name, stats in results['endpoints'].items():
+            line = (
+                f"{name:<16} {stats['requests']:>7} {stats['rps']:>8.1f} {stats['p50_ms']:>9.1f} "
+                f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['error_rate']:>8.1%}"
+            )
+            before = previous.get(name)
+            if before:
+                line += f"   p95 {stats['p95_ms'] - before['p95_ms']:+.1f} ms, rps {stats['rps'] - before['rps']:+.1f}"
+            self.stdout.write(line)
+            failures = {k: v for k, v in stats['outcomes'].items() if k != 'ok'}
+            if failures:
+                self.stdout.write(f"{'':<16} {failures}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Total: {results['total_requests']} requests, {results['rps']:.1f} req/s, "
+            f"{results['error_rate']:.1%} errors"
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from tracker.models import DailyEntry
+from tracker.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text index over journal notes from the DailyEntry table."
+
+    def handle(self, *args, **options):
+        if not rebuild_index():
+            self.stdout.write(self.style.WARNING("Full-text index is only available on SQLite; nothing to do."))
+            return
+        self.stdout.write(self.style.SUCCESS(f"Indexed {DailyEntry.objects.count()} journal entries."))
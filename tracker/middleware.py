@@ -0,0 +1,23 @@
+from django.db import OperationalError
+from django.http import HttpResponse
+
+# SQLite raises "database is locked" when a writer waits longer than its busy timeout.
+# That is back-pressure, not a bug: answer 503 with Retry-After instead of a generic 500,
+# so clients (and `manage.py loadtest`) can tell it apart whatever the DEBUG setting.
+
+RETRY_AFTER_SECONDS = 1
+
+
+class DatabaseBusyMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, OperationalError) and 'database is locked' in str(exception):
+            response = HttpResponse("The database is busy, please retry.", status=503, content_type='text/plain')
+            response['Retry-After'] = str(RETRY_AFTER_SECONDS)
+            return response
+        return None
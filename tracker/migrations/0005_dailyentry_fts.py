@@ -0,0 +1,67 @@
+# Full-text index over DailyEntry.notes (SQLite FTS5). No-op on other databases.
+#
+# The index is an external-content FTS5 table kept in sync by triggers, so every
+# insert/update/delete path (ORM, bulk operations, raw SQL) updates it. SQLite table
+# rebuilds done by later AlterField migrations on DailyEntry drop these triggers;
+# tracker.search.ensure_index() recreates them after every migrate.
+
+from django.db import migrations
+
+FORWARD = [
+    """
+    CREATE VIRTUAL TABLE tracker_dailyentry_fts USING fts5(
+        notes,
+        content='tracker_dailyentry',
+        content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER tracker_dailyentry_fts_ai AFTER INSERT ON tracker_dailyentry BEGIN
+        INSERT INTO tracker_dailyentry_fts(rowid, notes) VALUES (new.id, new.notes);
+    END
+    """,
+    """
+    CREATE TRIGGER tracker_dailyentry_fts_ad AFTER DELETE ON tracker_dailyentry BEGIN
+        INSERT INTO tracker_dailyentry_fts(tracker_dailyentry_fts, rowid, notes)
+        VALUES ('delete', old.id, old.notes);
+    END
+    """,
+    """
+    CREATE TRIGGER tracker_dailyentry_fts_au AFTER UPDATE OF notes ON tracker_dailyentry BEGIN
+        INSERT INTO tracker_dailyentry_fts(tracker_dailyentry_fts, rowid, notes)
+        VALUES ('delete', old.id, old.notes);
+        INSERT INTO tracker_dailyentry_fts(rowid, notes) VALUES (new.id, new.notes);
+    END
+    """,
+    # Backfill existing entries
+    "INSERT INTO tracker_dailyentry_fts(tracker_dailyentry_fts) VALUES ('rebuild')",
+]
+
+BACKWARD = [
+    "DROP TRIGGER IF EXISTS tracker_dailyentry_fts_au",
+    "DROP TRIGGER IF EXISTS tracker_dailyentry_fts_ad",
+    "DROP TRIGGER IF EXISTS tracker_dailyentry_fts_ai",
+    "DROP TABLE IF EXISTS tracker_dailyentry_fts",
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tracker", "0004_habitarchive"),
+    ]
+
+    operations = [
+        migrations.RunPython(run(FORWARD), run(BACKWARD)),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.10 on 2026-10-19 08:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tracker", "0005_dailyentry_fts"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CohortReport",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("data", models.JSONField()),
+                (
+                    "duration",
+                    models.FloatField(help_text="Seconds taken to build the report"),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-19 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tracker", "0006_cohortreport"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="dailyentry",
+            name="date",
+            field=models.DateField(db_index=True),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.10 on 2026-10-19 10:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_user(apps, schema_editor):
+    HabitLog = apps.get_model("tracker", "HabitLog")
+    DailyEntry = apps.get_model("tracker", "DailyEntry")
+    entry_user = DailyEntry.objects.filter(pk=OuterRef("entry_id")).values("user_id")[:1]
+    HabitLog.objects.using(schema_editor.connection.alias).update(user_id=Subquery(entry_user))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tracker", "0007_dailyentry_date_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="habitlog",
+            name="user",
+            field=models.ForeignKey(
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="habit_logs",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunPython(fill_user, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="habitlog",
+            name="user",
+            field=models.ForeignKey(
+                editable=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="habit_logs",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="habitlog",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name="habitlog",
+            index=models.Index(
+                fields=["user", "updated_at"], name="tracker_hab_user_id_30a167_idx"
+            ),
+        ),
+    ]
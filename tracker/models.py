@@ -1,8 +1,9 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinLengthValidator, RegexValidator
-from datetime import timedelta
+from datetime import date, timedelta
 from django.utils import timezone
+from django.utils.functional import cached_property
 
 class Habit(models.Model):
     # Default categories for suggestions, but field is free text
@@ -21,13 +22,21 @@ class Habit(models.Model):
         ]
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'updated_at'])]
 
     def __str__(self):
         return f"{self.name} ({self.user.username})"
 
-    @property
+    @cached_property
     def streaks(self):
-        dates = sorted(list(self.logs.values_list('entry__date', flat=True).distinct()))
+        from .archive import archived_series
+        archived, _ = archived_series(self)
+        dates = set(self.logs.values_list('entry__date', flat=True))
+        dates.update(date.fromordinal(d) for d in archived.tolist())
+        dates = sorted(dates)
         if not dates:
             return {'current': 0, 'longest': 0}
 
@@ -62,14 +71,16 @@ class Habit(models.Model):
 
 class DailyEntry(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_entries')
-    date = models.DateField()
+    date = models.DateField(db_index=True)
     productivity_score = models.IntegerField(choices=[(i, str(i)) for i in range(1, 11)], default=5)
     mood_score = models.IntegerField(choices=[(i, str(i)) for i in range(1, 11)], default=5)
     notes = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         unique_together = ('user', 'date')
         ordering = ['-date']
+        indexes = [models.Index(fields=['user', 'updated_at'])]
 
     def __str__(self):
         return f"Entry {self.date} - {self.user.username}"
@@ -77,10 +88,56 @@ class DailyEntry(models.Model):
 class HabitLog(models.Model):
     entry = models.ForeignKey(DailyEntry, on_delete=models.CASCADE, related_name='habit_logs')
     habit = models.ForeignKey(Habit, on_delete=models.CASCADE, related_name='logs')
+    # Copy of entry.user so per-user scans (sync, archive, cohort) use the (user, updated_at)
+    # index instead of joining every log to its entry. Set in save(); bulk_create must pass it.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='habit_logs', editable=False)
     value = models.FloatField(help_text="Actual value achieved")
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         unique_together = ('entry', 'habit')
+        indexes = [models.Index(fields=['user', 'updated_at'])]
+
+    def save(self, *args, **kwargs):
+        if self.user_id is None or HabitLog.entry.is_cached(self):
+            self.user_id = self.entry.user_id
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.habit.name}: {self.value} {self.habit.unit}"
+
+class Tombstone(models.Model):
+    # Records deletes so sync clients can drop rows they already have.
+    # No FK constraint on user: tombstones are written while a user's rows are cascade-deleted.
+    MODEL_CHOICES = [('habit', 'Habit'), ('entry', 'DailyEntry'), ('log', 'HabitLog')]
+
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    model = models.CharField(max_length=10, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'deleted_at'])]
+
+    def __str__(self):
+        return f"Deleted {self.model} #{self.object_id}"
+
+class HabitArchive(models.Model):
+    # Cold HabitLog rows packed into one compressed columnar blob per user (see tracker/archive.py)
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='habit_archive')
+    cutoff = models.DateField(help_text="Logs dated before this day are archived")
+    row_count = models.PositiveIntegerField(default=0)
+    data = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Archive {self.user.username} (<{self.cutoff}, {self.row_count} logs)"
+
+class CohortReport(models.Model):
+    # Output of `manage.py cohort_report`; the staff view shows the latest row
+    data = models.JSONField()
+    duration = models.FloatField(help_text="Seconds taken to build the report")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Cohort report {self.created_at:%Y-%m-%d %H:%M}"
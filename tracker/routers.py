@@ -0,0 +1,97 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+
+# Primary/replica routing.
+# Heavy read-only views (analytics, exports, reports) opt in with ReplicaReadMixin; everything
+# else, and every write, stays on the primary. After a user writes, a cookie pins their reads
+# to the primary for REPLICA_STICKY_SECONDS so they always see their own changes.
+
+PRIMARY = 'default'
+REPLICA = 'replica'
+PIN_COOKIE = 'primary_pin'
+
+# Mutable per-request state: a dict so that writes seen in a copied context (ASGI
+# sync_to_async) are still visible to the middleware.
+_request_state = ContextVar('replica_request_state', default=None)
+
+
+def replica_alias():
+    """The replica alias if one is configured, else the primary."""
+    return REPLICA if REPLICA in settings.DATABASES else PRIMARY
+
+
+def written_recently(timestamp_ns):
+    """Whether a write at `timestamp_ns` (time.time_ns()) may not have reached the replica yet."""
+    window = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+    return time.time_ns() - timestamp_ns < window * 1_000_000_000
+
+
+@contextmanager
+def primary_reads(enabled=True):
+    # Route reads in this block to the primary. Sets a copy of the state so that a
+    # background thread running in a copied context doesn't affect the request.
+    state = _request_state.get()
+    if not enabled or state is None:
+        yield
+        return
+    token = _request_state.set({**state, 'replica': False})
+    try:
+        yield
+    finally:
+        _request_state.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if state and state['replica'] and not state['pinned']:
+            return replica_alias()
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state['wrote'] = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return {obj1._state.db, obj2._state.db} <= {PRIMARY, REPLICA}
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
+
+
+class ReplicaStickinessMiddleware:
+    """Tracks writes per request and pins the client to the primary for a short window after one."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            pinned_until = float(request.COOKIES.get(PIN_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        state = {'replica': False, 'pinned': pinned_until > time.time(), 'wrote': False}
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+
+        if state['wrote'] and replica_alias() != PRIMARY:
+            window = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+            response.set_cookie(PIN_COOKIE, f"{time.time() + window:.3f}", max_age=window, httponly=True, samesite='Lax')
+        return response
+
+
+class ReplicaReadMixin:
+    # Route this view's reads to the replica (unless the client is pinned to the primary)
+    def dispatch(self, request, *args, **kwargs):
+        state = _request_state.get()
+        if state is not None:
+            state['replica'] = True
+        return super().dispatch(request, *args, **kwargs)
@@ -0,0 +1,143 @@
+import re
+from django.db import connection, connections
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from .models import DailyEntry
+
+# Journal search over DailyEntry.notes.
+# On SQLite this uses the FTS5 index from migration 0005 (bm25 ranking, snippets);
+# other databases fall back to icontains filters that, like the index, require every term.
+
+FTS_TABLE = 'tracker_dailyentry_fts'
+HIT_START, HIT_END = '\x02', '\x03'
+SNIPPET_TOKENS = 16
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+# Same triggers as migration 0005. SQLite drops them whenever a migration rebuilds
+# tracker_dailyentry (e.g. AlterField), so ensure_index() recreates them after migrate.
+TRIGGERS = {
+    f'{FTS_TABLE}_ai': f"""
+        CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON tracker_dailyentry BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, notes) VALUES (new.id, new.notes);
+        END
+    """,
+    f'{FTS_TABLE}_ad': f"""
+        CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON tracker_dailyentry BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, notes) VALUES ('delete', old.id, old.notes);
+        END
+    """,
+    f'{FTS_TABLE}_au': f"""
+        CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF notes ON tracker_dailyentry BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, notes) VALUES ('delete', old.id, old.notes);
+            INSERT INTO {FTS_TABLE}(rowid, notes) VALUES (new.id, new.notes);
+        END
+    """,
+}
+
+
+def build_match(query):
+    """Turn free text into a safe FTS5 expression: all terms required, last one as a prefix."""
+    terms = TERM_RE.findall(query)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def highlight(snippet):
+    # Escape the note text first, then turn the sentinel markers into <mark> tags
+    html = escape(snippet).replace(HIT_START, '<mark>').replace(HIT_END, '</mark>')
+    return mark_safe(html)
+
+
+def _filters(user, date_from, date_to, min_productivity, min_mood):
+    clauses, params = ['e.user_id = %s'], [user.pk]
+    for sql, value in (
+        ('e.date >= %s', date_from),
+        ('e.date <= %s', date_to),
+        ('e.productivity_score >= %s', min_productivity),
+        ('e.mood_score >= %s', min_mood),
+    ):
+        if value is not None:
+            clauses.append(sql)
+            params.append(value)
+    return clauses, params
+
+
+def search_entries(user, query, date_from=None, date_to=None, min_productivity=None, min_mood=None, limit=50):
+    """Best-matching journal entries of `user` as dicts with a highlighted `snippet`."""
+    match = build_match(query)
+    if match is None:
+        return []
+
+    if connection.vendor != 'sqlite':
+        entries = DailyEntry.objects.filter(user=user)
+        for term in TERM_RE.findall(query):
+            entries = entries.filter(notes__icontains=term)
+        if date_from:
+            entries = entries.filter(date__gte=date_from)
+        if date_to:
+            entries = entries.filter(date__lte=date_to)
+        if min_productivity:
+            entries = entries.filter(productivity_score__gte=min_productivity)
+        if min_mood:
+            entries = entries.filter(mood_score__gte=min_mood)
+        return [
+            {'id': e.id, 'date': e.date, 'productivity_score': e.productivity_score,
+             'mood_score': e.mood_score, 'snippet': escape(e.notes[:200])}
+            for e in entries[:limit]
+        ]
+
+    clauses, params = _filters(user, date_from, date_to, min_productivity, min_mood)
+    sql = f"""
+        SELECT e.id, e.date, e.productivity_score, e.mood_score,
+               snippet({FTS_TABLE}, 0, %s, %s, '…', %s) AS snippet
+        FROM {FTS_TABLE} f
+        JOIN tracker_dailyentry e ON e.id = f.rowid
+        WHERE {FTS_TABLE} MATCH %s AND {' AND '.join(clauses)}
+        ORDER BY bm25({FTS_TABLE})
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [HIT_START, HIT_END, SNIPPET_TOKENS, match, *params, limit])
+        columns = [col[0] for col in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    for row in rows:
+        row['snippet'] = highlight(row['snippet'] or '')
+    return rows
+
+
+def rebuild_index(using='default'):
+    """Re-index every journal entry (backfill after bulk imports or table rebuilds)."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def ensure_index(using='default'):
+    """Recreate missing sync triggers and re-index; returns the names of the triggers created."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE name = %s OR type = 'trigger'", [FTS_TABLE])
+        existing = {row[0] for row in cursor.fetchall()}
+        if FTS_TABLE not in existing:
+            # Migration 0005 not applied (yet); nothing to repair
+            return []
+        missing = [name for name in TRIGGERS if name not in existing]
+        for name in missing:
+            cursor.execute(TRIGGERS[name])
+    if missing:
+        # Writes made while a trigger was missing never reached the index
+        rebuild_index(using)
+    return missing
+
+
+def ensure_index_after_migrate(sender, using, **kwargs):
+    ensure_index(using)
@@ -0,0 +1,58 @@
+import threading
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from .models import Habit, DailyEntry, HabitLog, Tombstone
+from .singleflight import bump_version
+
+_state = threading.local()
+
+
+def data_version_key(user_id):
+    # Version of a user's habit data; part of the analytics single-flight cache key
+    return f"user_data_{user_id}"
+
+
+@receiver(post_save, sender=Habit)
+@receiver(post_save, sender=DailyEntry)
+def owned_row_saved(sender, instance, **kwargs):
+    bump_version(data_version_key(instance.user_id))
+
+@receiver(post_save, sender=HabitLog)
+def log_saved(sender, instance, **kwargs):
+    bump_version(data_version_key(instance.user_id))
+
+def _cascading(name):
+    # pks of habits/entries whose delete is in progress on this thread
+    if not hasattr(_state, name):
+        setattr(_state, name, set())
+    return getattr(_state, name)
+
+
+# A habit or entry tombstone implies its logs are gone too, so logs removed by the cascade
+# get no tombstones of their own. pre_delete runs for the parent before any log is deleted.
+@receiver(pre_delete, sender=Habit)
+def habit_deleting(sender, instance, **kwargs):
+    _cascading('habits').add(instance.pk)
+
+@receiver(pre_delete, sender=DailyEntry)
+def entry_deleting(sender, instance, **kwargs):
+    _cascading('entries').add(instance.pk)
+
+@receiver(post_delete, sender=Habit)
+def habit_deleted(sender, instance, **kwargs):
+    _cascading('habits').discard(instance.pk)
+    bump_version(data_version_key(instance.user_id))
+    Tombstone.objects.create(user_id=instance.user_id, model='habit', object_id=instance.pk)
+
+@receiver(post_delete, sender=DailyEntry)
+def entry_deleted(sender, instance, **kwargs):
+    _cascading('entries').discard(instance.pk)
+    bump_version(data_version_key(instance.user_id))
+    Tombstone.objects.create(user_id=instance.user_id, model='entry', object_id=instance.pk)
+
+@receiver(post_delete, sender=HabitLog)
+def log_deleted(sender, instance, **kwargs):
+    if instance.entry_id in _cascading('entries') or instance.habit_id in _cascading('habits'):
+        return
+    bump_version(data_version_key(instance.user_id))
+    Tombstone.objects.create(user_id=instance.user_id, model='log', object_id=instance.pk)
@@ -0,0 +1,96 @@
+import contextvars
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+# Request coalescing on top of the cache backend.
+# The first caller for a key takes a lock with cache.add() and computes; concurrent callers
+# wait for the result to appear instead of recomputing. With a shared backend (memcached,
+# redis, database) this spans worker processes; with LocMemCache it spans threads.
+#
+# With stale_while_revalidate, a caller that finds the previous result for the same base key
+# returns it immediately and the refresh runs in a background thread.
+
+POLL_INTERVAL = 0.05
+
+# Versions live in the cache too, so with a per-process backend a worker never sees another
+# worker's bump_version(); results it cached before that write are served until they expire.
+LOCAL_MAX_TIMEOUT = 60 * 5
+LOCAL_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache')
+
+
+def cache_timeout(timeout):
+    """Cap a result timeout to minutes when the cache backend is not shared between processes."""
+    if settings.CACHES['default']['BACKEND'] in LOCAL_BACKENDS:
+        return min(timeout, LOCAL_MAX_TIMEOUT)
+    return timeout
+
+
+def get_version(name):
+    # Starting from the current time means an evicted counter never repeats an older version
+    return cache.get_or_set(f"version:{name}", lambda: time.time_ns(), None)
+
+
+def bump_version(name):
+    cache.set(f"version:{name}", time.time_ns(), None)
+
+
+def _stale_key(base_key):
+    return f"{base_key}:last"
+
+
+def _refresh(key, base_key, version, compute, timeout, lock_key, owner):
+    try:
+        result = compute()
+        cache.set(key, result, cache_timeout(timeout))
+        cache.set(_stale_key(base_key), (version, result), None)
+        return result
+    finally:
+        if cache.get(lock_key) == owner:
+            cache.delete(lock_key)
+
+
+def single_flight(base_key, version, compute, timeout=600, lock_timeout=120,
+                  wait_timeout=60, stale_while_revalidate=False):
+    """Return compute() for (base_key, version), running it at most once at a time."""
+    key = f"{base_key}:v{version}"
+    lock_key = f"{key}:lock"
+
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    stale = cache.get(_stale_key(base_key)) if stale_while_revalidate else None
+    owner = uuid.uuid4().hex
+    deadline = time.monotonic() + wait_timeout
+
+    while True:
+        if cache.add(lock_key, owner, lock_timeout):
+            if stale is None:
+                return _refresh(key, base_key, version, compute, timeout, lock_key, owner)
+
+            # Serve the previous result; refresh in the background with this request's context
+            # (keeps DB routing) and a connection of its own.
+            def background():
+                try:
+                    _refresh(key, base_key, version, compute, timeout, lock_key, owner)
+                finally:
+                    connections.close_all()
+
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(background,), daemon=True).start()
+            return stale[1]
+
+        # Someone else is computing this exact key
+        if stale is not None:
+            return stale[1]
+        time.sleep(POLL_INTERVAL)
+        result = cache.get(key)
+        if result is not None:
+            return result
+        if time.monotonic() > deadline:
+            # The owner is stuck or gone; don't make the user wait any longer
+            return compute()
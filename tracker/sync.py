@@ -0,0 +1,162 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+import numpy as np
+from django.core import signing
+from django.db.models import Q
+from django.utils import timezone
+from .archive import as_float64, load_archive
+from .models import Habit, DailyEntry, HabitLog, HabitArchive, Tombstone
+
+# Delta sync for offline/mobile clients.
+# The sync token is a signed cursor holding, per stream, the (timestamp, id) of the
+# last row the client has seen. Rows are returned ordered by that pair so batches
+# never skip rows that share a timestamp.
+#
+# updated_at is taken when a row is saved, not when its transaction commits, so a slow
+# writer can commit a row stamped behind a cursor that was already handed out. The cursor
+# is therefore never moved past `now - OVERLAP`: rows changed within the last OVERLAP are
+# sent again on the next sync and clients must apply rows as idempotent upserts by id.
+#
+# Deleting a habit or an entry also deletes its logs; those logs get no tombstones of
+# their own, so clients drop a deleted habit's or entry's logs locally.
+#
+# Logs moved into the user's HabitArchive leave HabitLog without a tombstone. They are sent
+# in the 'archived' stream, with the same columns as 'logs', paged by id. The whole archive
+# is sent again whenever it changes (its updated_at is part of the cursor).
+
+TOKEN_SALT = 'tracker.sync'
+DEFAULT_BATCH = 500
+MAX_BATCH = 2000
+OVERLAP = timedelta(minutes=1)
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class InvalidSyncToken(Exception):
+    pass
+
+
+def _to_us(dt):
+    return (dt - EPOCH) // timedelta(microseconds=1)
+
+def _from_us(us):
+    return EPOCH + timedelta(microseconds=us)
+
+
+def _streams(user):
+    # name -> (queryset, timestamp field, fields sent to the client)
+    return {
+        'habits': (
+            Habit.objects.filter(user=user), 'updated_at',
+            ('id', 'name', 'category', 'target_value', 'unit'),
+        ),
+        'entries': (
+            DailyEntry.objects.filter(user=user), 'updated_at',
+            ('id', 'date', 'productivity_score', 'mood_score', 'notes'),
+        ),
+        'logs': (
+            HabitLog.objects.filter(user=user), 'updated_at',
+            ('id', 'entry_id', 'habit_id', 'value'),
+        ),
+        'deleted': (
+            Tombstone.objects.filter(user=user), 'deleted_at',
+            ('model', 'object_id'),
+        ),
+    }
+
+
+def _archived_changes(user, position, limit):
+    """(rows, cursor position, has_more) for the 'archived' stream; position is [version, last id]."""
+    updated_at = HabitArchive.objects.filter(user=user).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return [], position, False
+    version = _to_us(updated_at)
+    after = 0
+    if position and position[0] == version:
+        if position[1] is None:
+            # This version was sent in full
+            return [], position, False
+        after = position[1]
+
+    ids, dates, habit_ids, values = load_archive(user.pk)
+    order = np.argsort(ids)
+    start = int(np.searchsorted(ids[order], after, side='right'))
+    page = order[start:start + limit]
+    more = start + limit < len(order)
+    if not len(page):
+        return [], [version, None], False
+
+    ids, dates, habit_ids, values = ids[page], dates[page], habit_ids[page], as_float64(values[page])
+    first, last = date.fromordinal(int(dates.min())), date.fromordinal(int(dates.max()))
+    entries = {
+        day.toordinal(): entry_id for day, entry_id in
+        DailyEntry.objects.filter(user=user, date__range=(first, last)).values_list('date', 'id')
+    }
+    rows = [
+        [log_id, entries[ordinal], habit_id, value]
+        for log_id, ordinal, habit_id, value
+        in zip(ids.tolist(), dates.tolist(), habit_ids.tolist(), values.tolist())
+    ]
+    return rows, [version, rows[-1][0] if more else None], more
+
+
+def encode_token(cursor):
+    return signing.dumps(cursor, salt=TOKEN_SALT, compress=True)
+
+def decode_token(token):
+    if not token:
+        return {}
+    try:
+        cursor = signing.loads(token, salt=TOKEN_SALT)
+    except signing.BadSignature:
+        raise InvalidSyncToken("Sync token is invalid or was issued for another server.")
+    if not isinstance(cursor, dict):
+        raise InvalidSyncToken("Malformed sync token.")
+    return cursor
+
+
+def collect_changes(user, token=None, limit=DEFAULT_BATCH):
+    """Return rows changed since `token`, at most `limit` per stream, and the next token."""
+    cursor = decode_token(token)
+    limit = max(1, min(limit, MAX_BATCH))
+    streams = _streams(user)
+    horizon = [_to_us(timezone.now() - OVERLAP), 0]
+    changes = {}
+    has_more = False
+
+    for name, (qs, ts_field, fields) in streams.items():
+        position = cursor.get(name)
+        if position:
+            ts, last_id = _from_us(position[0]), position[1]
+            qs = qs.filter(Q(**{f'{ts_field}__gt': ts}) | Q(**{ts_field: ts, 'id__gt': last_id}))
+
+        columns = dict.fromkeys(('id', ts_field, *fields))
+        rows = list(qs.order_by(ts_field, 'id').values(*columns)[:limit + 1])
+        if len(rows) > limit:
+            has_more = True
+            rows = rows[:limit]
+            first = [_to_us(rows[0][ts_field]), rows[0]['id']]
+            last = [_to_us(rows[-1][ts_field]), rows[-1]['id']]
+            # A full batch inside the overlap window must still move the cursor, or paging never ends
+            cursor[name] = min(last, horizon) if horizon >= first else last
+        else:
+            end = [_to_us(rows[-1][ts_field]), rows[-1]['id']] if rows else position
+            if end:
+                cursor[name] = min(end, horizon)
+
+        changes[name] = [[row[field] for field in fields] for row in rows]
+
+    rows, position, more = _archived_changes(user, cursor.get('archived'), limit)
+    if position:
+        cursor['archived'] = position
+    changes['archived'] = rows
+    has_more = has_more or more
+
+    result = {
+        'changes': changes,
+        'has_more': has_more,
+        'token': encode_token(cursor),
+    }
+    # Column names are only sent on the first sync; rows are positional lists after that
+    if not token:
+        result['fields'] = {name: list(fields) for name, (_, _, fields) in streams.items()}
+        result['fields']['archived'] = result['fields']['logs']
+    return result
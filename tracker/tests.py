@@ -1,3 +1,501 @@
-from django.test import TestCase
+import threading
+import time
+from unittest import mock
+import numpy as np
+from datetime import date, timedelta
+from io import StringIO
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.conf import settings
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from .models import Habit, DailyEntry, HabitLog, HabitArchive, Tombstone, CohortReport
+from .archive import archive_user, unarchive_user, load_habit_frame
+from .cohort import chunk_stats
+from .heatmap import render_heatmap_svg
+from .middleware import DatabaseBusyMiddleware
+from .stats import bootstrap_ci, permutation_pvalue
+from .views import AnalyticsHabitView
+from .search import build_match, ensure_index, search_entries, TRIGGERS
+from .singleflight import single_flight, get_version, bump_version, cache_timeout, LOCAL_MAX_TIMEOUT
+from .routers import PrimaryReplicaRouter, primary_reads, written_recently, _request_state
+from .sync import collect_changes, InvalidSyncToken
+from .management.commands.loadtest import Command as LoadtestCommand
 
-# Create your tests here.
+
+class TrackerTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        self.habit = Habit.objects.create(
+            user=self.user, name='Sleep', category='Health', target_value=8, unit='hours'
+        )
+
+    def add_day(self, day, value=7, notes=''):
+        entry = DailyEntry.objects.create(
+            user=self.user, date=day, productivity_score=5, mood_score=5, notes=notes
+        )
+        HabitLog.objects.create(entry=entry, habit=self.habit, value=value)
+        return entry
+
+
+class ArchiveTests(TrackerTestCase):
+    def test_archive_round_trip(self):
+        for day in range(1, 31):
+            self.add_day(date(2024, 1, day), value=day / 10)
+        before = sorted(HabitLog.objects.values_list('id', 'entry_id', 'habit_id', 'value'))
+
+        # Read, archive upsert and one DELETE (plus savepoint): no per-row loads or signals
+        with self.assertNumQueries(6):
+            self.assertEqual(archive_user(self.user, date(2024, 1, 21)), 20)
+        self.assertEqual(HabitLog.objects.count(), 10)
+        self.assertFalse(Tombstone.objects.exists())
+
+        self.assertEqual(unarchive_user(self.user), 20)
+        after = sorted(HabitLog.objects.values_list('id', 'entry_id', 'habit_id', 'value'))
+        self.assertEqual(after, before)
+
+    def test_second_run_deletes_the_newly_archived_rows(self):
+        # More rows than DELETE_BATCH in both runs, so the delete loop takes several batches
+        start = date(2022, 1, 1)
+        for day in range(1200):
+            self.add_day(start + timedelta(days=day))
+        self.assertEqual(archive_user(self.user, start + timedelta(days=600)), 600)
+        self.assertEqual(archive_user(self.user, start + timedelta(days=1150)), 550)
+
+        self.assertEqual(HabitLog.objects.count(), 50)
+        self.assertEqual(HabitArchive.objects.get().row_count, 1150)
+        self.assertEqual(len(load_habit_frame(self.habit)), 1200)
+
+    def test_relogged_archived_day_is_archived_once(self):
+        entries = [self.add_day(date(2024, 1, day), value=1) for day in range(1, 6)]
+        archive_user(self.user, date(2024, 1, 6))
+        # Logged again after archiving: the live row wins, then gets archived itself
+        HabitLog.objects.create(entry=entries[2], habit=self.habit, value=9)
+        self.assertEqual(archive_user(self.user, date(2024, 1, 6)), 1)
+
+        frame = load_habit_frame(self.habit)
+        self.assertEqual(list(frame['value']), [1, 1, 9, 1, 1])
+        self.assertEqual(HabitArchive.objects.get().row_count, 5)
+        self.assertEqual(unarchive_user(self.user), 5)
+        self.assertEqual(HabitLog.objects.get(entry=entries[2]).value, 9)
+
+    def test_readers_ignore_archived_logs_of_deleted_entries(self):
+        today = timezone.localdate()
+        entries = [self.add_day(today - timedelta(days=d)) for d in range(5)]
+        archive_user(self.user, today)
+        self.assertEqual(Habit.objects.get().streaks, {'current': 5, 'longest': 5})
+
+        entries[2].delete()
+        habit = Habit.objects.get()
+        self.assertEqual(habit.streaks, {'current': 2, 'longest': 2})
+        self.assertEqual(len(load_habit_frame(habit)), 4)
+        self.assertIn('4 days logged', render_heatmap_svg(habit))
+
+    def test_habit_list_loads_archive_once(self):
+        for name in ('Reading', 'Water', 'Walk'):
+            Habit.objects.create(user=self.user, name=name, category='Health', target_value=1, unit='x')
+        for day in range(1, 11):
+            self.add_day(date(2024, 1, day))
+        archive_user(self.user, date(2024, 1, 6))
+        self.client.force_login(self.user)
+        # session, user and habits; the archive and its entry days once; one log query per habit
+        with self.assertNumQueries(3 + 2 + 4):
+            self.client.get(reverse('habit_list'))
+
+
+class SyncTests(TrackerTestCase):
+    def backdate(self, minutes=10):
+        # Move every row out of the overlap window (update() leaves auto_now alone)
+        past = timezone.now() - timedelta(minutes=minutes)
+        for model in (Habit, DailyEntry, HabitLog):
+            model.objects.update(updated_at=past)
+        Tombstone.objects.update(deleted_at=past)
+
+    def test_log_stream_reads_the_denormalized_user(self):
+        log = self.add_day(date(2024, 1, 1)).habit_logs.get()
+        self.assertEqual(log.user_id, self.user.id)
+        with CaptureQueriesContext(connection) as queries:
+            collect_changes(self.user, None, 500)
+        self.assertFalse([
+            query for query in queries
+            if 'FROM "tracker_habitlog"' in query['sql'] and 'tracker_dailyentry' in query['sql']
+        ])
+
+    def sync_all(self, token=None, limit=500):
+        pages = []
+        while True:
+            data = collect_changes(self.user, token, limit)
+            pages.append(data)
+            token = data['token']
+            if not data['has_more']:
+                return pages, token
+
+    def test_first_sync_sends_field_names(self):
+        self.add_day(date(2024, 1, 1))
+        data = collect_changes(self.user)
+        self.assertEqual(data['fields']['logs'], ['id', 'entry_id', 'habit_id', 'value'])
+        self.assertEqual(len(data['changes']['entries']), 1)
+        self.assertNotIn('fields', collect_changes(self.user, data['token']))
+
+    def test_token_round_trip(self):
+        self.add_day(date(2024, 1, 1))
+        self.backdate()
+        _, token = self.sync_all()
+        data = collect_changes(self.user, token)
+        self.assertEqual(data['changes'], {'habits': [], 'entries': [], 'logs': [], 'deleted': [], 'archived': []})
+
+        entry = self.add_day(date(2024, 1, 2))
+        DailyEntry.objects.filter(pk=entry.pk).update(updated_at=timezone.now() - timedelta(minutes=5))
+        data = collect_changes(self.user, token)
+        self.assertEqual([row[0] for row in data['changes']['entries']], [entry.pk])
+
+    def test_invalid_token(self):
+        with self.assertRaises(InvalidSyncToken):
+            collect_changes(self.user, 'not-a-token')
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('sync'), {'since': 'not-a-token'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_pagination_sends_every_row_once(self):
+        entries = [self.add_day(date(2024, 1, d)) for d in range(1, 8)]
+        self.backdate()
+        pages, _ = self.sync_all(limit=3)
+        self.assertEqual(len(pages), 3)
+        ids = [row[0] for page in pages for row in page['changes']['entries']]
+        self.assertEqual(ids, [entry.pk for entry in entries])
+
+    def test_recent_rows_are_sent_again(self):
+        # Rows inside the overlap window may still have late-committing neighbours
+        entries = [self.add_day(date(2024, 1, d)) for d in range(1, 8)]
+        pages, token = self.sync_all(limit=3)
+        ids = [row[0] for page in pages for row in page['changes']['entries']]
+        self.assertEqual(sorted(set(ids)), [entry.pk for entry in entries])
+        again = collect_changes(self.user, token)
+        self.assertEqual(len(again['changes']['entries']), 7)
+
+    def test_late_commit_behind_cursor_is_not_skipped(self):
+        self.add_day(date(2024, 1, 1))
+        _, token = self.sync_all()
+        # Saved before the cursor was issued, committed after it
+        late = self.add_day(date(2024, 1, 2))
+        DailyEntry.objects.filter(pk=late.pk).update(updated_at=timezone.now() - timedelta(seconds=30))
+        data = collect_changes(self.user, token)
+        self.assertIn(late.pk, [row[0] for row in data['changes']['entries']])
+
+    def test_fresh_sync_includes_archived_logs(self):
+        for day in range(1, 11):
+            self.add_day(date(2024, 1, day), value=day + 0.1)
+        expected = sorted(HabitLog.objects.values_list('id', 'entry_id', 'habit_id', 'value'))
+        archive_user(self.user, date(2024, 1, 8))
+
+        pages, token = self.sync_all(limit=3)
+        rows = [tuple(row) for page in pages for name in ('logs', 'archived') for row in page['changes'][name]]
+        self.assertEqual(sorted(set(rows)), expected)
+        self.assertEqual(len([row for page in pages for row in page['changes']['archived']]), 7)
+        self.assertEqual(pages[0]['fields']['archived'], pages[0]['fields']['logs'])
+
+        # Sent once per archive version
+        self.assertEqual(collect_changes(self.user, token)['changes']['archived'], [])
+
+    def test_tombstones(self):
+        entry = self.add_day(date(2024, 1, 1))
+        other = self.add_day(date(2024, 1, 2))
+        HabitLog.objects.create(entry=entry, habit=Habit.objects.create(
+            user=self.user, name='Reading', category='Learning', target_value=30, unit='pages'
+        ), value=10)
+        log = other.habit_logs.get()
+        log_id, entry_id = log.pk, entry.pk
+        self.backdate()
+        _, token = self.sync_all()
+
+        log.delete()
+        # The entry's logs go with it: one tombstone, no per-log lookups or inserts
+        with self.assertNumQueries(4):
+            entry.delete()
+
+        deleted = collect_changes(self.user, token)['changes']['deleted']
+        self.assertCountEqual(deleted, [['log', log_id], ['entry', entry_id]])
+
+
+
+class CohortReportTests(TrackerTestCase):
+    def test_view_serves_stored_report(self):
+        for day, value in enumerate([5, 6, 7, 8], start=1):
+            entry = self.add_day(date(2024, 1, day), value=value)
+            entry.productivity_score = day
+            entry.save()
+        staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.client.force_login(staff)
+
+        response = self.client.get(reverse('cohort_report'))
+        self.assertContains(response, 'No report yet')
+        self.assertNotContains(response, 'sleep')
+
+        call_command('cohort_report', workers=1, stdout=StringIO())
+        call_command('cohort_report', workers=1, stdout=StringIO())
+        self.assertEqual(CohortReport.objects.count(), 1)
+        response = self.client.get(reverse('cohort_report'))
+        self.assertContains(response, 'sleep')
+
+    def test_archived_logs_stay_in_the_stats(self):
+        for day, value in enumerate([5, 6, 7, 8, 6], start=1):
+            entry = self.add_day(date(2024, 1, day), value=value)
+            entry.productivity_score = day
+            entry.save()
+        before = chunk_stats([self.user.id])
+
+        archive_user(self.user, date(2024, 1, 4))
+        # A relogged archived day counts once, with its live value
+        HabitLog.objects.create(entry=DailyEntry.objects.get(date=date(2024, 1, 3)), habit=self.habit, value=7)
+        after = chunk_stats([self.user.id])
+        self.assertEqual(before.keys(), after.keys())
+        for key, stats in before.items():
+            self.assertEqual(vars(stats).keys(), vars(after[key]).keys())
+            for name, value in vars(stats).items():
+                np.testing.assert_allclose(value, vars(after[key])[name])
+
+
+class HomeSummaryTests(TrackerTestCase):
+    def test_summary_follows_writes_made_outside_the_views(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('home'))
+        self.assertIsNone(response.context['summary_habits'][0]['today_value'])
+
+        # e.g. an admin edit: no view-level invalidation runs
+        self.add_day(timezone.localdate(), value=9)
+        response = self.client.get(reverse('home'))
+        habit = response.context['summary_habits'][0]
+        self.assertEqual((habit['today_value'], habit['week_logged'], habit['week_met']), (9, 1, 1))
+        self.assertTrue(habit['done_today'])
+
+
+class SingleFlightTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+
+    def compute(self, result):
+        def compute():
+            self.calls.append(result)
+            return result
+        return compute
+
+    def test_waiter_gets_the_owners_result(self):
+        # Another worker holds the lock and publishes its result shortly after
+        cache.add('graph:v1:lock', 'other', 60)
+        timer = threading.Timer(0.1, cache.set, ('graph:v1', 'owner', 60))
+        timer.start()
+        self.assertEqual(single_flight('graph', 1, self.compute('waiter')), 'owner')
+        timer.join()
+        self.assertEqual(self.calls, [])
+
+    def test_lock_is_released_when_compute_fails(self):
+        def fail():
+            raise ValueError('boom')
+        with self.assertRaises(ValueError):
+            single_flight('graph', 1, fail)
+        self.assertIsNone(cache.get('graph:v1:lock'))
+        self.assertEqual(single_flight('graph', 1, self.compute('ok'), wait_timeout=0), 'ok')
+
+    def test_stale_result_is_served_while_refreshing(self):
+        self.assertEqual(single_flight('graph', 1, self.compute('old')), 'old')
+        self.assertEqual(single_flight('graph', 2, self.compute('new'), stale_while_revalidate=True), 'old')
+        deadline = time.monotonic() + 5
+        while cache.get('graph:v2:lock') is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(single_flight('graph', 2, self.compute('again'), stale_while_revalidate=True), 'new')
+        self.assertEqual(self.calls, ['old', 'new'])
+
+    def test_version_bump_changes_the_key(self):
+        version = get_version('alice')
+        self.assertEqual(get_version('alice'), version)
+        self.assertEqual(single_flight('graph', version, self.compute('first')), 'first')
+        self.assertEqual(single_flight('graph', version, self.compute('cached')), 'first')
+        bump_version('alice')
+        self.assertNotEqual(get_version('alice'), version)
+        self.assertEqual(single_flight('graph', get_version('alice'), self.compute('second')), 'second')
+        self.assertEqual(self.calls, ['first', 'second'])
+
+    def test_per_process_cache_caps_timeouts(self):
+        self.assertEqual(cache_timeout(60 * 60 * 24), LOCAL_MAX_TIMEOUT)
+        self.assertEqual(cache_timeout(60), 60)
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'cache'}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(cache_timeout(60 * 60 * 24), 60 * 60 * 24)
+
+
+class AdminTests(TrackerTestCase):
+    def test_entry_changelist_has_date_hierarchy(self):
+        self.add_day(date(2024, 3, 1))
+        admin_user = User.objects.create_superuser('root', password='pw')
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse('admin:tracker_dailyentry_changelist'), {'date__year': 2024})
+        self.assertContains(response, '?date__month=3&amp;date__year=2024')
+
+
+class LoadtestTests(TestCase):
+    def test_cleanup_removes_simulated_users_and_sessions(self):
+        command = LoadtestCommand(stdout=StringIO())
+        sim_users = command.prepare_users(2, days=3)
+        self.assertEqual(HabitLog.objects.count(), 2 * 3 * 3)
+
+        command.cleanup(sim_users, remove_users=True)
+        self.assertFalse(User.objects.filter(username__startswith='loadtest_').exists())
+        self.assertFalse(HabitLog.objects.exists())
+        self.assertFalse(Tombstone.objects.exists())
+        self.assertFalse(Session.objects.exists())
+
+    def test_lock_timeouts_become_503(self):
+        middleware = DatabaseBusyMiddleware(lambda request: None)
+        request = RequestFactory().get('/')
+        response = middleware.process_exception(request, OperationalError('database is locked'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertIsNone(middleware.process_exception(request, OperationalError('no such table: x')))
+
+
+class ReplicaRoutingTests(TestCase):
+    def test_recent_writes_are_read_from_the_primary(self):
+        router = PrimaryReplicaRouter()
+        with override_settings(DATABASES={**settings.DATABASES, 'replica': settings.DATABASES['default']}):
+            token = _request_state.set({'replica': True, 'pinned': False, 'wrote': False})
+            try:
+                self.assertEqual(router.db_for_read(Habit), 'replica')
+                with primary_reads(written_recently(time.time_ns())):
+                    self.assertEqual(router.db_for_read(Habit), 'default')
+                self.assertEqual(router.db_for_read(Habit), 'replica')
+                with primary_reads(written_recently(time.time_ns() - 60 * 1_000_000_000)):
+                    self.assertEqual(router.db_for_read(Habit), 'replica')
+            finally:
+                _request_state.reset(token)
+
+
+class JournalSearchTests(TrackerTestCase):
+    def search(self, query):
+        return [row['id'] for row in search_entries(self.user, query)]
+
+    def test_build_match_quotes_terms(self):
+        self.assertEqual(build_match('deep "work" OR sleep*'), '"deep" "work" "OR" "sleep"*')
+        self.assertEqual(build_match('NEAR(a b) -c'), '"NEAR" "a" "b" "c"*')
+        self.assertIsNone(build_match('"*" ()'))
+
+    def test_index_follows_inserts_updates_and_deletes(self):
+        entry = self.add_day(date(2024, 1, 1), notes='Slept badly, long run')
+        self.add_day(date(2024, 1, 2), notes='Quiet day')
+        self.assertEqual(self.search('run'), [entry.pk])
+        self.assertEqual(self.search('slept lon'), [entry.pk])
+        self.assertEqual(self.search('slept quiet'), [])
+
+        entry.notes = 'Reading all evening'
+        entry.save()
+        self.assertEqual(self.search('run'), [])
+        self.assertEqual(self.search('evening'), [entry.pk])
+
+        entry.delete()
+        self.assertEqual(self.search('evening'), [])
+
+    def test_fallback_requires_every_term(self):
+        entry = self.add_day(date(2024, 1, 1), notes='Slept badly, long run')
+        self.add_day(date(2024, 1, 2), notes='Quiet run')
+        with mock.patch('tracker.search.connection') as fake:
+            fake.vendor = 'postgresql'
+            self.assertEqual(self.search('run slept'), [entry.pk])
+            self.assertEqual(self.search('slept quiet'), [])
+
+    def test_snippet_is_escaped(self):
+        self.add_day(date(2024, 1, 1), notes='<b>bold</b> move')
+        snippet = search_entries(self.user, 'move')[0]['snippet']
+        self.assertIn('&lt;b&gt;', snippet)
+        self.assertIn('<mark>move</mark>', snippet)
+
+    def test_missing_triggers_are_recreated(self):
+        with connection.cursor() as cursor:
+            for name in TRIGGERS:
+                cursor.execute(f'DROP TRIGGER {name}')
+        entry = self.add_day(date(2024, 1, 1), notes='Written while unindexed')
+        self.assertEqual(self.search('unindexed'), [])
+
+        self.assertCountEqual(ensure_index(), TRIGGERS)
+        self.assertEqual(ensure_index(), [])
+        self.assertEqual(self.search('unindexed'), [entry.pk])
+
+
+class StatsTests(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.x = rng.normal(size=200)
+        self.noise = rng.normal(size=200)
+
+    def test_bootstrap_ci_brackets_the_correlation(self):
+        y = 0.5 * self.x + self.noise
+        r = np.corrcoef(self.x, y)[0, 1]
+        low, high = bootstrap_ci(self.x, y)
+        self.assertLess(low, r)
+        self.assertGreater(high, r)
+        self.assertGreater(low, 0)
+        self.assertEqual(bootstrap_ci(self.x, y), (low, high))
+
+    def test_permutation_pvalue(self):
+        self.assertLess(permutation_pvalue(self.x, 0.5 * self.x + self.noise), 0.01)
+        self.assertGreater(permutation_pvalue(self.x, self.noise), 0.05)
+
+    def test_false_positive_rate_on_independent_data(self):
+        rng = np.random.default_rng(7)
+        rejected = sum(
+            permutation_pvalue(rng.normal(size=60), rng.normal(size=60), permutations=500, seed=i) < 0.05
+            for i in range(200)
+        )
+        self.assertLess(rejected / 200, 0.1)
+
+    def test_undefined_inputs(self):
+        self.assertTrue(np.isnan(permutation_pvalue([1, 2], [3, 4])))
+        self.assertTrue(np.isnan(permutation_pvalue(self.x, np.ones(200))))
+        self.assertTrue(all(np.isnan(bootstrap_ci([1, 2], [2, 1]))))
+
+
+class AnalyticsStatsTests(TrackerTestCase):
+    def test_significance_uses_unsmoothed_values(self):
+        rng = np.random.default_rng(3)
+        for day, (value, score) in enumerate(zip(rng.normal(8, 1, 90), rng.integers(1, 11, 90))):
+            entry = self.add_day(date(2024, 1, 1) + timedelta(days=day), value=round(value, 2))
+            entry.productivity_score = int(score)
+            entry.save()
+
+        graph = AnalyticsHabitView().build_graph(self.habit, 7, 3.0, 'productivity', False)
+        frame = load_habit_frame(self.habit)
+        self.assertTrue(graph['smoothed'])
+        self.assertAlmostEqual(graph['daily_correlation'], frame['value'].corr(frame['productivity']))
+        self.assertEqual(graph['p_value'], permutation_pvalue(frame['value'], frame['productivity']))
+
+    def test_fragment_only_serves_own_habits(self):
+        other = User.objects.create_user('bob', password='pw')
+        habit = Habit.objects.create(user=other, name='Run', target_value=5)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('analytics_habit', args=[habit.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_fragment_without_enough_data(self):
+        self.add_day(date(2024, 1, 1))
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('analytics_habit', args=[self.habit.pk]))
+        self.assertEqual(response.context['graph'], {})
+        self.assertContains(response, 'Not enough data')
+
+    def test_shell_does_not_build_charts(self):
+        for name in ('Run', 'Read'):
+            Habit.objects.create(user=self.user, name=name, target_value=1)
+        for day in range(10):
+            self.add_day(date(2024, 1, 1) + timedelta(days=day))
+        self.client.force_login(self.user)
+        with mock.patch.object(AnalyticsHabitView, 'build_graph') as build_graph, \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('analytics'), {'window': 7})
+        build_graph.assert_not_called()
+        self.assertFalse([query for query in queries if 'tracker_habitlog' in query['sql']])
+        for habit in Habit.objects.filter(user=self.user):
+            self.assertContains(response, reverse('analytics_habit', args=[habit.pk]) + '?window=7')
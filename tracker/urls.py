@@ -8,8 +8,12 @@ urlpatterns = [
     path('habits/<int:pk>/', views.HabitDetailView.as_view(), name='habit_detail'),
     path('habits/<int:pk>/edit/', views.HabitUpdateView.as_view(), name='habit_edit'),
     path('journal/', views.DailyLogListView.as_view(), name='daily_log_list'),
+    path('journal/search/', views.JournalSearchView.as_view(), name='journal_search'),
     path('journal/add/', views.DailyLogCreateView.as_view(), name='daily_log_add'),
     path('journal/<int:pk>/edit/', views.DailyLogUpdateView.as_view(), name='daily_log_edit'),
     path('log/add/', views.HabitLogCreateView.as_view(), name='habit_log_add'),
     path('analytics/', views.AnalyticsView.as_view(), name='analytics'),
+    path('analytics/habit/<int:pk>/', views.AnalyticsHabitView.as_view(), name='analytics_habit'),
+    path('analytics/cohort/', views.CohortReportView.as_view(), name='cohort_report'),
+    path('api/sync/', views.SyncView.as_view(), name='sync'),
 ]
@@ -1,13 +1,26 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
+from django.views import View
 from django.views.generic import TemplateView, ListView, DetailView
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
-from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Avg
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.db.models import Avg, Count, Max, Q, F, Subquery
 from django.core.cache import cache
-from .models import Habit, DailyEntry, HabitLog
-from .forms import HabitForm, DailyEntryForm, HabitLogForm
-import pandas as pd
+from django.conf import settings
+from django.http import JsonResponse
+from .models import Habit, DailyEntry, HabitLog, CohortReport
+from .forms import HabitForm, DailyEntryForm, HabitLogForm, JournalSearchForm
+from .heatmap import render_heatmap_svg
+from .search import search_entries
+from .stats import bootstrap_ci, permutation_pvalue
+from .archive import attach_archive, load_habit_frame
+from .routers import ReplicaReadMixin, primary_reads, written_recently
+from .singleflight import single_flight, get_version, cache_timeout
+from .signals import data_version_key
+from .sync import collect_changes, InvalidSyncToken, DEFAULT_BATCH
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+from datetime import timedelta
 import numpy as np
 import matplotlib.pyplot as plt
 import io
@@ -23,6 +36,76 @@ class UserOwnsObjectMixin:
 class HomeView(LoginRequiredMixin, TemplateView):
     template_name = 'tracker/home.html'
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Summary is cached per user per day and per data version, so any write to the
+        # user's data (views, admin, sync clients) shows up on the next load
+        today = timezone.localdate()
+        user_id = self.request.user.id
+        cache_key = f"home_summary_{user_id}_{today}_v{get_version(data_version_key(user_id))}"
+        summary = cache.get(cache_key)
+        if summary is None:
+            summary = self.build_summary(today)
+            cache.set(cache_key, summary, cache_timeout(60 * 60 * 24))
+        context.update(summary)
+        return context
+
+    def build_summary(self, today):
+        user = self.request.user
+        week_start = today - timedelta(days=today.weekday())
+        recent = DailyEntry.objects.filter(user=user, date__gt=today - timedelta(days=7), date__lte=today)
+
+        def recent_avg(field):
+            # Uncorrelated scalar subquery: evaluated once, not per habit row
+            return Subquery(recent.values('user').annotate(avg=Avg(field)).values('avg')[:1])
+
+        # This week's logs only, found through the (user, date) index on entries rather than
+        # by joining each habit's whole log history
+        week = {
+            row['habit']: row for row in
+            HabitLog.objects.filter(entry__user=user, entry__date__gte=week_start, entry__date__lte=today)
+            .values('habit')
+            .annotate(
+                today_value=Max('value', filter=Q(entry__date=today)),
+                week_logged=Count('id'),
+                week_met=Count('id', filter=Q(value__gte=F('habit__target_value'))),
+            )
+        }
+        habits = list(
+            Habit.objects.filter(user=user)
+            .annotate(
+                avg_productivity=recent_avg('productivity_score'),
+                avg_mood=recent_avg('mood_score'),
+            )
+            .order_by('name')
+            .values('id', 'name', 'unit', 'target_value', 'avg_productivity', 'avg_mood')
+        )
+
+        if habits:
+            averages = {'productivity': habits[0]['avg_productivity'], 'mood': habits[0]['avg_mood']}
+        else:
+            averages = recent.aggregate(productivity=Avg('productivity_score'), mood=Avg('mood_score'))
+
+        days_this_week = today.weekday() + 1
+        for habit in habits:
+            logged = week.get(habit['id'], {})
+            habit['today_value'] = logged.get('today_value')
+            habit['week_logged'] = logged.get('week_logged', 0)
+            habit['week_met'] = logged.get('week_met', 0)
+            value = habit['today_value'] or 0
+            target = habit['target_value']
+            habit['today_pct'] = min(100, round(value / target * 100)) if target > 0 else (100 if value else 0)
+            habit['done_today'] = habit['today_value'] is not None and value >= target
+
+        return {
+            'today': today,
+            'summary_habits': habits,
+            'done_today': sum(h['done_today'] for h in habits),
+            'days_this_week': days_this_week,
+            'avg_productivity': averages['productivity'],
+            'avg_mood': averages['mood'],
+        }
+
 class HabitListView(LoginRequiredMixin, ListView):
     model = Habit
     template_name = 'tracker/habit_list.html'
@@ -31,11 +114,31 @@ class HabitListView(LoginRequiredMixin, ListView):
     def get_queryset(self):
          return Habit.objects.filter(user=self.request.user)
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Streaks read archived logs too: decompress the user's archive once, not per habit
+        context['habits'] = attach_archive(list(context['habits']))
+        return context
+
 class HabitDetailView(LoginRequiredMixin, DetailView):
     model = Habit
     template_name = 'tracker/habit_detail.html'
     context_object_name = 'habit'
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # SVG heatmap is cached per habit per day and per data version, so any write to the
+        # user's data (views, admin, sync clients) shows up on the next render
+        today = timezone.localdate()
+        version = get_version(data_version_key(self.object.user_id))
+        cache_key = f"habit_heatmap_{self.object.pk}_{today}_v{version}"
+        svg = cache.get(cache_key)
+        if svg is None:
+            svg = render_heatmap_svg(self.object, end=today)
+            cache.set(cache_key, svg, cache_timeout(60 * 60 * 24))
+        context['heatmap_svg'] = mark_safe(svg)
+        return context
+
 class HabitCreateView(LoginRequiredMixin, CreateView):
     model = Habit
     form_class = HabitForm
@@ -94,6 +197,22 @@ class DailyLogListView(LoginRequiredMixin, ListView):
             
         return super().get(request, *args, **kwargs)
 
+class JournalSearchView(LoginRequiredMixin, TemplateView):
+    template_name = 'tracker/journal_search.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        form = JournalSearchForm(self.request.GET or None)
+        context['form'] = form
+        if form.is_valid() and form.cleaned_data['q']:
+            data = form.cleaned_data
+            context['results'] = search_entries(
+                self.request.user, data['q'],
+                date_from=data['date_from'], date_to=data['date_to'],
+                min_productivity=data['min_productivity'], min_mood=data['min_mood'],
+            )
+        return context
+
 class DailyLogCreateView(LoginRequiredMixin, CreateView):
     model = DailyEntry
     form_class = DailyEntryForm
@@ -137,7 +256,7 @@ class HabitLogCreateView(LoginRequiredMixin, CreateView):
         # The form has 'habit' and 'value'. It needs 'entry'.
         # Strategy: Get or create DailyEntry for today for this user.
         
-        today = pd.Timestamp.now().date()
+        today = timezone.localdate()
         entry, created = DailyEntry.objects.get_or_create(
             user=self.request.user,
             date=today,
@@ -158,128 +277,210 @@ class HabitLogCreateView(LoginRequiredMixin, CreateView):
         return super().form_valid(form)
 
 
-class AnalyticsView(LoginRequiredMixin, TemplateView):
+class AnalyticsParamsMixin:
+    def get_controls(self):
+        # Get control parameters from request
+        return {
+            'window': int(self.request.GET.get('window', 1)),
+            'std': float(self.request.GET.get('std', 3.0)),
+            'metric': self.request.GET.get('metric', 'productivity'), # 'productivity' or 'mood'
+            'normalize': self.request.GET.get('normalize') == 'on',
+        }
+
+
+class AnalyticsView(LoginRequiredMixin, AnalyticsParamsMixin, TemplateView):
+    # Page shell only: each habit's chart is fetched from AnalyticsHabitView when scrolled into view
     template_name = 'tracker/analytics.html'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        
-        # Get control parameters from request
-        window_size = int(self.request.GET.get('window', 1))
-        outlier_std = float(self.request.GET.get('std', 3.0))
-        target_metric = self.request.GET.get('metric', 'productivity') # 'productivity' or 'mood'
-        normalize = self.request.GET.get('normalize') == 'on'
-
-        context['controls'] = {
-            'window': window_size,
-            'std': outlier_std,
-            'metric': target_metric,
-            'normalize': normalize
-        }
-        
-        habits = Habit.objects.all()
-        graphs = []
+        context['controls'] = self.get_controls()
+        context['habits'] = Habit.objects.filter(user=self.request.user).only('id', 'name').order_by('name')
+        context['query'] = self.request.GET.urlencode()
+        return context
 
-        for habit in habits:
-            # Get logs for this habit sorted by date for rolling window
-            logs = HabitLog.objects.filter(habit=habit).select_related('entry').order_by('entry__date')
-            if not logs.exists():
-                continue
-            
-            data = []
-            for log in logs:
-                data.append({
-                    'date': log.entry.date,
-                    'value': log.value,
-                    'productivity': log.entry.productivity_score,
-                    'mood': log.entry.mood_score
-                })
-            
-            df = pd.DataFrame(data)
-            if df.empty or len(df) < 2:
-                continue
-
-            # 1. Rolling Window (Smoothing)
-            if window_size > 1:
-                df['value'] = df['value'].rolling(window=window_size, min_periods=1, center=True).mean()
-                df[target_metric] = df[target_metric].rolling(window=window_size, min_periods=1, center=True).mean()
-
-            # 2. Outlier Removal (Z-Score > threshold)
-            # Remove rows where habit value is an outlier
-            if len(df) > 5: # Only if enough data
-                mean = df['value'].mean()
-                std = df['value'].std()
-                if std > 0:
-                     df = df[np.abs(df['value'] - mean) <= (outlier_std * std)]
-            
-            if df.empty or len(df) < 2:
-                continue
-
-            # 3. Normalization (Min-Max to 0-10 scale for visual comparison)
-            if normalize:
-                min_val = df['value'].min()
-                max_val = df['value'].max()
-                if max_val > min_val:
-                    df['value_scaled'] = 1 + (df['value'] - min_val) * 9 / (max_val - min_val)
-                    plot_x = 'value_scaled'
-                    xlabel = f"{habit.name} (Scaled 1-10)"
-                else:
-                    plot_x = 'value'
-                    xlabel = f"{habit.name} ({habit.unit})"
+
+class AnalyticsHabitView(LoginRequiredMixin, ReplicaReadMixin, AnalyticsParamsMixin, TemplateView):
+    # Chart + correlation fragment for one habit
+    template_name = 'tracker/analytics_habit.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        habit = get_object_or_404(Habit, pk=self.kwargs['pk'], user=self.request.user)
+        controls = self.get_controls()
+
+        # Identical concurrent requests (reloads, double clicks) share one computation.
+        # The data version changes on every write to this user's habits/entries/logs.
+        user_id = self.request.user.id
+        base_key = (
+            f"analytics_{user_id}_{habit.pk}_{controls['window']}_{controls['std']}"
+            f"_{controls['metric']}_{int(controls['normalize'])}"
+        )
+
+        version = get_version(data_version_key(user_id))
+
+        def compute():
+            # The version is the time of the user's last write. While the replica may still be
+            # behind it, read the primary so stale data is never cached under the new version.
+            with primary_reads(written_recently(version)):
+                graph = self.build_graph(
+                    habit, controls['window'], controls['std'], controls['metric'], controls['normalize']
+                )
+            # {} rather than None so "not enough data" is cached as well
+            return graph or {}
+
+        context['habit'] = habit
+        context['graph'] = single_flight(
+            base_key,
+            version,
+            compute,
+            stale_while_revalidate=getattr(settings, 'ANALYTICS_STALE_WHILE_REVALIDATE', False),
+        )
+        return context
+
+    def build_graph(self, habit, window_size, outlier_std, target_metric, normalize):
+        # Logs for this habit sorted by date for rolling window (archived + live rows)
+        df = load_habit_frame(habit)
+        if df.empty or len(df) < 2:
+            return None
+
+        # Unsmoothed copy for the significance stats: a rolling mean makes neighbouring days
+        # share values, which breaks the independence the bootstrap and permutation test assume
+        daily = df[['value', target_metric]].copy()
+
+        # 1. Rolling Window (Smoothing)
+        if window_size > 1:
+            df['value'] = df['value'].rolling(window=window_size, min_periods=1, center=True).mean()
+            df[target_metric] = df[target_metric].rolling(window=window_size, min_periods=1, center=True).mean()
+
+        # 2. Outlier Removal (Z-Score > threshold)
+        # Remove rows where habit value is an outlier
+        if len(df) > 5: # Only if enough data
+            mean = df['value'].mean()
+            std = df['value'].std()
+            if std > 0:
+                 df = df[np.abs(df['value'] - mean) <= (outlier_std * std)]
+
+        if df.empty or len(df) < 2:
+            return None
+
+        # 3. Normalization (Min-Max to 0-10 scale for visual comparison)
+        if normalize:
+            min_val = df['value'].min()
+            max_val = df['value'].max()
+            if max_val > min_val:
+                df['value_scaled'] = 1 + (df['value'] - min_val) * 9 / (max_val - min_val)
+                plot_x = 'value_scaled'
+                xlabel = f"{habit.name} (Scaled 1-10)"
             else:
                 plot_x = 'value'
                 xlabel = f"{habit.name} ({habit.unit})"
+        else:
+            plot_x = 'value'
+            xlabel = f"{habit.name} ({habit.unit})"
+
+        # Calculate Correlation
+        corr_val = df[plot_x].corr(df[target_metric])
+        # How much to trust it: bootstrap CI and permutation-test p-value over the same days,
+        # unsmoothed (min-max scaling doesn't change a correlation)
+        daily = daily.loc[df.index]
+        daily_corr = daily['value'].corr(daily[target_metric])
+        ci_low, ci_high = bootstrap_ci(daily['value'], daily[target_metric])
+        p_value = permutation_pvalue(daily['value'], daily[target_metric])
+
+        # --- Graph 1: Scatter (Correlation) ---
+        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
+
+        # Scatter Plot
+        ax1.scatter(df[plot_x], df[target_metric], alpha=0.7, c='blue')
+        if len(df) > 1:
+            z = np.polyfit(df[plot_x], df[target_metric], 1)
+            p = np.poly1d(z)
+            ax1.plot(df[plot_x], p(df[plot_x]), "r--", alpha=0.8)
+
+        ax1.set_title(
+            f"Correlation: {corr_val:.2f}\n"
+            f"Daily values: r={daily_corr:.2f}, 95% CI {ci_low:.2f} to {ci_high:.2f}, p={p_value:.3f}"
+        )
+        ax1.set_xlabel(xlabel)
+        ax1.set_ylabel(f"{target_metric.title()} Score")
+        ax1.grid(True, linestyle='--', alpha=0.5)
+
+        # --- Graph 2: Time Series Overlay ---
+        # Dual axis plot
+        color = 'tab:blue'
+        ax2.set_xlabel('Date')
+        ax2.set_ylabel(xlabel, color=color)
+        ax2.plot(df['date'], df[plot_x], color=color, label='Habit', marker='o', markersize=4)
+        ax2.tick_params(axis='y', labelcolor=color)
+        ax2.tick_params(axis='x', rotation=45)
+
+        ax3 = ax2.twinx()  # instantiate a second axes that shares the same x-axis
+        color = 'tab:red'
+        ax3.set_ylabel(f'{target_metric.title()} Score', color=color)
+        ax3.plot(df['date'], df[target_metric], color=color, label='Metric', linestyle='--', marker='x', markersize=4)
+        ax3.tick_params(axis='y', labelcolor=color)
+
+        ax2.set_title(f"Time Series Trend (Window: {window_size}d)")
+        fig.tight_layout()
+
+        # Save to buffer
+        buf = io.BytesIO()
+        fig.savefig(buf, format='png')
+        buf.seek(0)
+        string = base64.b64encode(buf.read())
+        uri = urllib.parse.quote(string)
+        graph = {
+            'habit': habit,
+            'image': uri,
+            'correlation': corr_val,
+            'daily_correlation': daily_corr,
+            'smoothed': window_size > 1,
+            'ci_low': ci_low,
+            'ci_high': ci_high,
+            'p_value': p_value,
+            'n_samples': len(df)
+        }
+        plt.close(fig)
+        return graph
 
-            # Calculate Correlation
-            corr_val = df[plot_x].corr(df[target_metric])
-            
-            # --- Graph 1: Scatter (Correlation) ---
-            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
-            
-            # Scatter Plot
-            ax1.scatter(df[plot_x], df[target_metric], alpha=0.7, c='blue')
-            if len(df) > 1:
-                z = np.polyfit(df[plot_x], df[target_metric], 1)
-                p = np.poly1d(z)
-                ax1.plot(df[plot_x], p(df[plot_x]), "r--", alpha=0.8)
-
-            ax1.set_title(f"Correlation: {corr_val:.2f}")
-            ax1.set_xlabel(xlabel)
-            ax1.set_ylabel(f"{target_metric.title()} Score")
-            ax1.grid(True, linestyle='--', alpha=0.5)
-
-            # --- Graph 2: Time Series Overlay ---
-            # Dual axis plot
-            color = 'tab:blue'
-            ax2.set_xlabel('Date')
-            ax2.set_ylabel(xlabel, color=color)
-            ax2.plot(df['date'], df[plot_x], color=color, label='Habit', marker='o', markersize=4)
-            ax2.tick_params(axis='y', labelcolor=color)
-            ax2.tick_params(axis='x', rotation=45)
-
-            ax3 = ax2.twinx()  # instantiate a second axes that shares the same x-axis
-            color = 'tab:red'
-            ax3.set_ylabel(f'{target_metric.title()} Score', color=color)
-            ax3.plot(df['date'], df[target_metric], color=color, label='Metric', linestyle='--', marker='x', markersize=4)
-            ax3.tick_params(axis='y', labelcolor=color)
-
-            ax2.set_title(f"Time Series Trend (Window: {window_size}d)")
-            fig.tight_layout()
-
-            # Save to buffer
-            buf = io.BytesIO()
-            fig.savefig(buf, format='png')
-            buf.seek(0)
-            string = base64.b64encode(buf.read())
-            uri = urllib.parse.quote(string)
-            graphs.append({
-                'habit': habit,
-                'image': uri,
-                'correlation': corr_val,
-                'n_samples': len(df)
-            })
-            plt.close(fig)
-
-        context['graphs'] = graphs
-        return context
 
+class SyncView(LoginRequiredMixin, ReplicaReadMixin, View):
+    # Delta sync for offline clients: GET ?since=<token>&limit=<n>
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = int(request.GET.get('limit', DEFAULT_BATCH))
+        except ValueError:
+            return JsonResponse({'error': 'limit must be an integer'}, status=400)
+        try:
+            data = collect_changes(request.user, request.GET.get('since'), limit)
+        except InvalidSyncToken as exc:
+            return JsonResponse({'error': str(exc)}, status=400)
+        return JsonResponse(data)
+
+
+class CohortReportView(LoginRequiredMixin, UserPassesTestMixin, ReplicaReadMixin, TemplateView):
+    # Staff-only cross-user report. Built offline by `manage.py cohort_report` (e.g. from cron);
+    # the view only reads the latest stored run
+    template_name = 'tracker/cohort_report.html'
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        metric = self.request.GET.get('metric', 'productivity')
+        latest = CohortReport.objects.order_by('-created_at').first()
+        report = latest.data if latest else {'by_name': {}, 'by_category': {}}
+
+        def rows(groups):
+            return [
+                {'group': group, **metrics[metric]}
+                for group, metrics in groups.items() if metric in metrics
+            ]
+
+        context['metric'] = metric
+        context['report'] = latest
+        context['by_name'] = rows(report['by_name'])
+        context['by_category'] = rows(report['by_category'])
+        return context